@@ -0,0 +1,286 @@
+'''
+auto_match.py
+
+Automatic matching of a client skeleton onto the generic keys, so a `standard` dict doesn't have to
+be written by hand for every new rig.
+
+Both skeletons are normalized for position and scale, every proper axis permutation is tried to
+find the client's facing, and joints are then paired globally with a Hungarian assignment over a
+vectorized cost built from normalized positions, bone directions, topology (child counts, chain
+lengths, branch points) and left/right hints from the names.
+
+No Maya imports in here; skeleton.auto_standard() gathers the inputs from the scene and datablock.
+'''
+
+import re
+
+import numpy as np
+
+from . import vector_math as vm
+
+# How much each part of the cost counts.  Positions are in units of the skeleton's RMS radius.
+POSITION_WEIGHT = 1.0
+DIRECTION_WEIGHT = 0.35
+TOPOLOGY_WEIGHT = 0.25
+SIDE_WEIGHT = 1.0
+
+# How many of the best facings get a full assignment solve.
+FACING_CANDIDATES = 4
+
+_LEFT_TOKENS = set(['l', 'lf', 'lft', 'left', 'lt'])
+_RIGHT_TOKENS = set(['r', 'rt', 'rgt', 'right'])
+
+
+def linear_assignment(cost):
+    '''
+    Minimum cost assignment of rows to columns (the Hungarian method, as shortest augmenting paths
+    with potentials), with the inner loop vectorized over columns.
+
+    usage:
+    linear_assignment(cost)
+    cost - (R, C) array.  Rectangular is fine; every row gets a column when R <= C, and every column
+    gets a row otherwise.
+
+    returns:
+    (rows, columns) - int64 arrays of the matched pairs, sorted by row.
+    '''
+
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if(transposed):
+        cost = cost.T
+    row_count, column_count = cost.shape
+
+    # 1-based, with column 0 as the virtual start of each augmenting path.
+    row_potential = np.zeros(row_count + 1)
+    column_potential = np.zeros(column_count + 1)
+    column_row = np.zeros(column_count + 1, dtype=np.int64)
+    way = np.zeros(column_count + 1, dtype=np.int64)
+
+    for row in range(1, row_count + 1):
+        column_row[0] = row
+        column = 0
+        min_slack = np.full(column_count + 1, np.inf)
+        used = np.zeros(column_count + 1, dtype=bool)
+
+        while(True):
+            used[column] = True
+            current_row = column_row[column]
+            slack = cost[current_row - 1] - row_potential[current_row] - column_potential[1:]
+
+            free = ~used[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = column
+
+            masked = np.where(free, min_slack[1:], np.inf)
+            next_column = int(np.argmin(masked)) + 1
+            delta = masked[next_column - 1]
+
+            row_potential[column_row[used]] += delta
+            column_potential[used] -= delta
+            min_slack[1:][free] -= delta
+
+            column = next_column
+            if(column_row[column] == 0):
+                break
+
+        # Flip the augmenting path.
+        while(column):
+            previous = way[column]
+            column_row[column] = column_row[previous]
+            column = previous
+
+    columns = np.flatnonzero(column_row[1:])
+    rows = column_row[1:][columns] - 1
+
+    if(transposed):
+        rows, columns = columns, rows
+    order = np.argsort(rows)
+
+    return rows[order].astype(np.int64), columns[order].astype(np.int64)
+
+
+def side_hints(names):
+    '''
+    +1 for names that say left, -1 for right, 0 when they don't say.  Handles 'left_hip',
+    'L_armUpr', 'mixamorig:LeftArm', 'hand.R' and the like.
+
+    returns:
+    (N,) float64 array.
+    '''
+
+    hints = np.zeros(len(names))
+    for i, name in enumerate(names):
+        lowered = str(name).split(':')[-1].lower()
+        tokens = set(token for token in re.split(r'[^a-z]+',
+            re.sub(r'([a-z])([A-Z])', r'\1_\2', str(name).split(':')[-1]).lower()) if token)
+        if(tokens & _LEFT_TOKENS or lowered.startswith('left')):
+            hints[i] = 1.0
+        elif(tokens & _RIGHT_TOKENS or lowered.startswith('right')):
+            hints[i] = -1.0
+
+    return hints
+
+
+def topology_features(parents):
+    '''
+    Per-joint topology descriptors that don't depend on how many joints the skeleton has.
+
+    returns:
+    (N, 5) float64 array: child count (capped at 4, over 4), depth and subtree size (both
+    relative to the skeleton), joints left down the chain to the next branch or leaf (relative),
+    and 1.0 for branch points.
+    '''
+
+    parents = np.asarray(parents, dtype=np.int64)
+    count = len(parents)
+    child_counts = np.bincount(parents[parents >= 0], minlength=count)
+
+    depths = np.zeros(count)
+    order = []
+    pending = list(np.flatnonzero(parents < 0))
+    children = [[] for _ in range(count)]
+    for child, parent in enumerate(parents):
+        if(parent >= 0):
+            children[parent].append(child)
+    while(pending):
+        node = pending.pop()
+        order.append(node)
+        for child in children[node]:
+            depths[child] = depths[node] + 1
+            pending.append(child)
+
+    # Leaves up: subtree sizes, and how far each single-child chain runs.
+    subtree = np.ones(count)
+    chain = np.zeros(count)
+    for node in reversed(order):
+        if(parents[node] >= 0):
+            subtree[parents[node]] += subtree[node]
+        if(child_counts[node] == 1):
+            chain[node] = chain[children[node][0]] + 1
+
+    features = np.zeros((count, 5))
+    features[:, 0] = np.minimum(child_counts, 4) / 4.0
+    features[:, 1] = depths / max(depths.max(initial=0), 1.0)
+    features[:, 2] = np.log1p(subtree) / np.log1p(max(count, 1))
+    features[:, 3] = chain / max(chain.max(initial=0), 1.0)
+    features[:, 4] = (child_counts > 1).astype(np.float64)
+
+    return features
+
+
+def normalize_positions(positions):
+    '''
+    Centre points on their centroid and scale them to an RMS radius of 1.
+    '''
+
+    positions = vm.as_vectors(positions)
+    centered = positions - positions.mean(axis=0)
+    radius = np.sqrt((centered ** 2).sum(axis=1).mean())
+
+    return centered / radius if radius > vm.EPSILON else centered
+
+
+def _bone_directions(positions, parents):
+    parents = np.asarray(parents, dtype=np.int64)
+    directions = np.zeros_like(positions)
+    has_parent = parents >= 0
+    directions[has_parent] = positions[has_parent] - positions[parents[has_parent]]
+
+    return vm.normalize(directions)
+
+
+def cost_matrix(reference_positions, reference_parents, reference_sides, client_positions,
+    client_parents, client_sides, reference_topology=None, client_topology=None):
+    '''
+    (M, N) cost of giving each of M reference joints each of N client joints.  Positions should
+    already be normalized and in the same facing.
+    '''
+
+    if(reference_topology is None):
+        reference_topology = topology_features(reference_parents)
+    if(client_topology is None):
+        client_topology = topology_features(client_parents)
+
+    reference_positions = vm.as_vectors(reference_positions)
+    client_positions = vm.as_vectors(client_positions)
+
+    position_cost = np.linalg.norm(
+        reference_positions[:, None, :] - client_positions[None, :, :], axis=2)
+
+    direction_cost = 1.0 - (_bone_directions(reference_positions, reference_parents) @
+        _bone_directions(client_positions, client_parents).T)
+
+    topology_cost = np.linalg.norm(
+        reference_topology[:, None, :] - client_topology[None, :, :], axis=2)
+
+    # Only a name that says the opposite side costs anything.
+    side_cost = (np.asarray(reference_sides)[:, None] * np.asarray(client_sides)[None, :] < 0)
+
+    return (POSITION_WEIGHT * position_cost + DIRECTION_WEIGHT * direction_cost +
+        TOPOLOGY_WEIGHT * topology_cost + SIDE_WEIGHT * side_cost)
+
+
+def match_skeletons(reference_names, reference_parents, reference_positions, client_names,
+    client_parents, client_positions, max_cost=1.0):
+    '''
+    Pair up reference joints with client joints.
+
+    usage:
+    match_skeletons(reference_names, reference_parents, reference_positions, client_names,
+        client_parents, client_positions, max_cost=float)
+    *_names - joint names (or generic keys); only used for left/right hints.
+    *_parents - parent index of each joint, -1 for roots.
+    *_positions - (N, 3) world positions, in any scale, offset or axis facing.
+    max_cost - pairs that cost more than this are dropped.
+
+    returns:
+    (matches, confidences, facing) - (M,) client index for each reference joint (-1 when nothing
+    fit), (M,) confidences from 0 to 1, and the (3, 3) rotation that was found to line the client
+    up with the reference.
+    '''
+
+    reference_positions = normalize_positions(reference_positions)
+    client_positions = normalize_positions(client_positions)
+    reference_sides = side_hints(reference_names)
+    client_sides = side_hints(client_names)
+    reference_topology = topology_features(reference_parents)
+    client_topology = topology_features(client_parents)
+
+    # Cheap facing check for all 24: how far each reference joint is from its nearest client joint.
+    turned = np.einsum('nj,pjk->pnk', client_positions, vm.AXIS_PERMUTATIONS)
+    nearest = np.linalg.norm(reference_positions[None, :, None, :] - turned[:, None, :, :],
+        axis=3).min(axis=2).mean(axis=1)
+    candidates = np.argsort(nearest)[:FACING_CANDIDATES]
+
+    best = None
+    for candidate in candidates:
+        cost = cost_matrix(reference_positions, reference_parents, reference_sides,
+            turned[candidate], client_parents, client_sides, reference_topology, client_topology)
+        rows, columns = linear_assignment(cost)
+        total = cost[rows, columns].sum()
+        if(best is None or total < best[0]):
+            best = (total, candidate, cost, rows, columns)
+
+    _, candidate, cost, rows, columns = best
+
+    matches = np.full(len(reference_positions), -1, dtype=np.int64)
+    confidences = np.zeros(len(reference_positions))
+    assigned_cost = cost[rows, columns]
+    keep = assigned_cost <= max_cost
+    matches[rows[keep]] = columns[keep]
+
+    # Confidence is how clearly the pick beats the runner-up for that reference joint, scaled down
+    # as the pick itself gets expensive.
+    if(cost.shape[1] > 1):
+        runner_up = np.partition(cost[rows], 1, axis=1)[:, :2]
+        alternative = np.where(np.isclose(runner_up[:, 0], assigned_cost), runner_up[:, 1],
+            runner_up[:, 0])
+    else:
+        alternative = np.full(len(rows), np.inf)
+    margin = np.clip((alternative - assigned_cost) / np.maximum(alternative, vm.EPSILON), 0.0, 1.0)
+    confidences[rows] = np.where(keep, margin * np.clip(1.0 - assigned_cost / max_cost, 0.0, 1.0),
+        0.0)
+
+    return matches, confidences, vm.AXIS_PERMUTATIONS[candidate]
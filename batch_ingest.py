@@ -0,0 +1,223 @@
+'''
+batch_ingest.py
+
+Batch ingestion of client FBX deliveries: every file in a folder (or listed in a manifest) is read
+into a datablock by a pool of worker processes, added to the datablock cache, and summed up in a
+report of joint counts, duplicate names, failures and timings.
+
+Workers use the Maya-free fbx_reader by default.  engine='maya' has each worker start its own
+maya.standalone session and run fbx_utils.import_skeleton instead; run it from mayapy for that.
+
+usage:
+report = ingest('/deliveries/client_a', report_path='/deliveries/client_a/ingest.json')
+print_report(report)
+'''
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import datablock as db
+from . import fbx_reader
+
+FBX_EXTENSIONS = ('.fbx',)
+ENGINES = ['reader', 'maya']
+
+
+def collect_files(source):
+    '''
+    FBX paths to ingest, sorted and absolute.
+
+    usage:
+    collect_files(source)
+    source - a folder (searched recursively for .fbx files), a .json manifest holding a list of
+    paths, or a text manifest with one path per line.  Relative manifest paths are relative to the
+    manifest.
+    '''
+
+    if(os.path.isdir(source)):
+        found = []
+        for folder, _, file_names in os.walk(source):
+            found.extend(os.path.join(folder, file_name) for file_name in file_names
+                if os.path.splitext(file_name)[1].lower() in FBX_EXTENSIONS)
+        return sorted(os.path.abspath(path) for path in found)
+
+    if(not os.path.isfile(source)):
+        raise ValueError("{} is neither a folder nor a manifest file.".format(source))
+
+    with open(source) as fp:
+        if(source.lower().endswith('.json')):
+            paths = json.load(fp)
+        else:
+            paths = [line.strip() for line in fp if line.strip() and not line.startswith('#')]
+
+    base = os.path.dirname(os.path.abspath(source))
+
+    return [os.path.abspath(os.path.join(base, path)) for path in paths]
+
+
+def _start_maya():
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    import maya.cmds as cmds
+    cmds.loadPlugin('fbxmaya', quiet=True)
+
+
+def _ingest_file(file_path, engine):
+    '''
+    Worker: read one file.  Failures come back as a message instead of being raised, so one bad
+    file doesn't stop the batch.
+    '''
+
+    start = time.perf_counter()
+    try:
+        if(engine == 'maya'):
+            import maya.cmds as cmds
+            from . import fbx_utils
+            cmds.file(new=True, force=True)
+            datablock = fbx_utils.import_skeleton(file_path)
+        else:
+            datablock = fbx_reader.read_skeleton(file_path)
+        error = None
+    except Exception as exc:
+        datablock = None
+        error = "{}: {}".format(type(exc).__name__, exc)
+
+    return file_path, datablock, error, time.perf_counter() - start
+
+
+def _file_entry(file_path, datablock, seconds, cached=False, error=None):
+    entry = {'path': file_path, 'seconds': round(seconds, 4), 'cached': cached, 'error': error}
+    if(datablock is not None):
+        node_types = datablock.records['node_type']
+        entry['joints'] = int((node_types == 'joint').sum())
+        entry['transforms'] = int((node_types == 'transform').sum())
+        entry['duplicates'] = list(datablock.duplicates)
+
+    return entry
+
+
+def ingest(source, cache_dir=db.DEFAULT_CACHE_DIR, workers=None, engine='reader',
+    report_path=None):
+    '''
+    Read every FBX in source into the datablock cache across a process pool.
+
+    usage:
+    ingest(source, cache_dir=[string], workers=[int], engine=[string], report_path=[string])
+    source - folder or manifest (see collect_files.)
+    cache_dir - datablock cache folder (see datablock.DatablockCache.)  Files the same engine has
+    already read into it aren't read again; reader and Maya results are kept apart.
+    workers - process count; defaults to the CPU count.
+    engine - 'reader' for fbx_reader (no Maya needed) or 'maya' for a standalone import per worker.
+    report_path - (optional) also write the report here as JSON.
+
+    returns:
+    (dict) report with 'files' (one entry per file, in order) and 'summary'.
+    '''
+
+    if(engine not in ENGINES):
+        raise ValueError("engine must be one of {}, not '{}'.".format(ENGINES, engine))
+
+    batch_start = time.perf_counter()
+    file_paths = collect_files(source)
+    producer = db.MAYA_PRODUCER if engine == 'maya' else fbx_reader.CACHE_PRODUCER
+    cache = db.DatablockCache(cache_dir, producer=producer)
+    entries = {}
+
+    # Cache hits are answered here; only the rest go to the pool.
+    pending = []
+    for file_path in file_paths:
+        start = time.perf_counter()
+        try:
+            cached = cache.get(file_path)
+        except (OSError, ValueError):
+            cached = None
+        if(cached is None):
+            pending.append(file_path)
+        else:
+            entries[file_path] = _file_entry(file_path, cached, time.perf_counter() - start,
+                cached=True)
+
+    if(pending):
+        initializer = _start_maya if engine == 'maya' else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+            futures = dict((pool.submit(_ingest_file, file_path, engine), file_path)
+                for file_path in pending)
+            for done, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                # A worker that dies (a crashing Maya, say) breaks the pool, and the cache write can
+                # fail too; either way it's recorded against the file and the batch goes on.
+                try:
+                    _, datablock, error, seconds = future.result()
+                except Exception as exc:
+                    datablock, seconds = None, 0.0
+                    error = "Worker failed: {}: {}".format(type(exc).__name__, exc)
+                # The cache index isn't safe to share between processes, so only this one writes.
+                if(datablock is not None):
+                    try:
+                        cache.put(file_path, datablock, write_index=False)
+                    except (OSError, ValueError) as exc:
+                        error = "Couldn't cache: {}: {}".format(type(exc).__name__, exc)
+                entries[file_path] = _file_entry(file_path, datablock, seconds, error=error)
+                print("[{}/{}] {} {}".format(done, len(pending), os.path.basename(file_path),
+                    error or "ok ({:.2f}s)".format(seconds)))
+
+    for file_path in pending:
+        if(file_path not in entries):
+            entries[file_path] = _file_entry(file_path, None, 0.0,
+                error="Never finished; the worker pool stopped first.")
+
+    # One index write for the whole batch.
+    try:
+        cache.flush()
+    except OSError as exc:
+        print("Couldn't write the cache index in {}: {}".format(cache_dir, exc))
+
+    files = [entries[file_path] for file_path in file_paths]
+    read = [entry for entry in files if not entry['cached'] and entry['error'] is None]
+    report = {
+        'source': os.path.abspath(source),
+        'engine': engine,
+        'cache_dir': cache_dir,
+        'files': files,
+        'summary': {
+            'files': len(files),
+            'read': len(read),
+            'cached': sum(1 for entry in files if entry['cached']),
+            'failed': sum(1 for entry in files if entry['error'] is not None),
+            'with_duplicates': sum(1 for entry in files if entry.get('duplicates')),
+            'joints': sum(entry.get('joints', 0) for entry in files),
+            'read_seconds': round(sum(entry['seconds'] for entry in read), 4),
+            'wall_seconds': round(time.perf_counter() - batch_start, 4),
+            }
+        }
+
+    if(report_path):
+        with open(report_path, 'w') as fp:
+            json.dump(report, fp, sort_keys=True, indent=4)
+        print("Wrote {}".format(report_path))
+
+    return report
+
+
+def print_report(report):
+    '''
+    Print an ingest() report: one line per file, then the totals.
+    '''
+
+    for entry in report['files']:
+        if(entry['error'] is not None):
+            print("FAILED  {}: {}".format(entry['path'], entry['error']))
+            continue
+        status = 'cached' if entry['cached'] else '{:.3f}s'.format(entry['seconds'])
+        line = "{:>8}  {} - {} joints, {} transforms".format(status, entry['path'],
+            entry['joints'], entry['transforms'])
+        if(entry['duplicates']):
+            line += ", duplicate names: {}".format(entry['duplicates'])
+        print(line)
+
+    summary = report['summary']
+    print("{files} files: {read} read, {cached} cached, {failed} failed, {with_duplicates} with "
+        "duplicate names.  {joints} joints; {read_seconds}s reading, {wall_seconds}s "
+        "total.".format(**summary))
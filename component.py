@@ -6,29 +6,199 @@
 
 import pymel.core as pm
 import pymel.core.datatypes as dt
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+import numpy as np
 
+from . import delta_math as dm
 from . import progbar as prg
+from . import spatial as spt
 
-def list_vertex_deltas(new_geo, original_geo):
+def get_mesh_fn(geo):
+    '''
+    Get an om2 MFnMesh for a piece of geo without touching the viewport selection.
+
+    usage:
+    get_mesh_fn(geo)
+    geo - string name or PyNode of a mesh transform or shape.
+    '''
+
+    selection = om.MSelectionList()
+    selection.add(str(geo))
+    dag_path = selection.getDagPath(0)
+    # Transforms are extended down to their shape so either can be passed in.
+    dag_path.extendToShape()
+
+    return om.MFnMesh(dag_path)
+
+
+def get_points(geo, space=om.MSpace.kWorld):
+    '''
+    Read every vertex position of a mesh in one query.
+
+    usage:
+    get_points(geo, space=om.MSpace)
+    geo - string name or PyNode of a mesh.
+    space - om2 MSpace constant, world space by default.
+
+    returns:
+    (N, 3) float64 numpy array in vertex order.
+    '''
+
+    return dm.as_points(get_mesh_fn(geo).getPoints(space))
+
+
+def get_topology_fingerprint(geo):
+    '''
+    Hash the topology of a mesh (vertex count and face-vertex ids), ignoring point positions.
+
+    usage:
+    get_topology_fingerprint(geo)
+    geo - string name or PyNode of a mesh.
+
+    returns:
+    (string) hex digest from delta_math.topology_fingerprint.
+    '''
+
+    mesh_fn = get_mesh_fn(geo)
+    face_counts, face_connects = mesh_fn.getVertices()
+
+    return dm.topology_fingerprint(mesh_fn.numVertices, face_counts, face_connects)
+
+
+def get_triangles(geo):
+    '''
+    Get the triangulation of a mesh as an (T, 3) int64 numpy array of vertex ids.
+    '''
+
+    _, triangle_vertices = get_mesh_fn(geo).getTriangles()
+
+    return np.asarray(triangle_vertices, dtype=np.int64).reshape(-1, 3)
+
+
+def corresponding_points(original_geo, query_points, correspondence='triangle', 
+    original_points=None):
+    '''
+    Find where each query point lands on original_geo, regardless of vertex order or topology.
+
+    usage:
+    corresponding_points(original_geo, query_points, correspondence=[string])
+    correspondence - 'vertex' snaps to the nearest vertex, 'triangle' to the closest point on the
+    surface (see spatial.triangle_correspondence.)
+    original_points - (optional) points of original_geo if they've been read already.
+
+    returns:
+    (triangle_vertices, barycentric) - (Q, 3) vertex ids and weights on original_geo.  In 'vertex'
+    mode all the weight sits on the first id.
+    '''
+
+    if(original_points is None):
+        original_points = get_points(original_geo)
+
+    if(correspondence == 'vertex'):
+        nearest, _ = spt.KDTree(original_points).nearest(query_points)
+        triangle_vertices = np.repeat(nearest[:, None], 3, axis=1)
+        barycentric = np.zeros((len(nearest), 3))
+        barycentric[:, 0] = 1.0
+    elif(correspondence == 'triangle'):
+        triangle_vertices, barycentric, _ = spt.triangle_correspondence(
+            original_points, get_triangles(original_geo), query_points
+            )
+    else:
+        pm.error("Bad correspondence mode {}; should be 'vertex' or 'triangle'.".format(
+            correspondence))
+
+    return triangle_vertices, barycentric
+
+
+def list_vertex_deltas(new_geo, original_geo, as_vectors=False):
     '''
     Will take two pieces of geo and compare their positional offsets.
-    The vertex order of the geo should match, or else it'll fail to zip the two lists of zips.
+    The vertex order of the geo should match, or else the deltas are meaningless.  Each delta is
+    how far that vertex moved from original_geo to new_geo (its sculpt offset), sliding included.
+    To carry deltas onto a mesh with other topology, see transfer_vertex_deltas.
+
+    Both meshes are read in bulk and subtracted in one vectorized step (see delta_math.)
+
+    usage:
+    list_vertex_deltas(new_geo, original_geo, as_vectors=[boolean])
+    as_vectors - Return a list of dt.Vector instead of a numpy array, for older callers.
+
+    returns:
+    (N, 3) numpy array of world space deltas, or a list of dt.Vector with as_vectors.
+    '''
+
+    new_points = get_points(new_geo)
+    original_points = get_points(original_geo)
+
+    if(len(new_points) != len(original_points)):
+        pm.error("{} has {} verts but {} has {}; vertex order/count must match.".format(
+            new_geo, len(new_points), original_geo, len(original_points)))
+
+    print("Calculating {} vert deltas...".format(len(new_points)))
+    deltas = dm.point_deltas(new_points, original_points)
+
+    if(as_vectors):
+        return [dt.Vector(delta) for delta in deltas.tolist()]
+
+    return deltas
+
+
+def iter_vertex_deltas(new_geo, original_geo, chunk_size=65536):
+    '''
+    Streaming version of list_vertex_deltas for meshes too big to hold in memory a few times over.
+    Vertices are read and diffed in fixed-size ranges, so peak memory depends on chunk_size and not
+    on the size of the mesh.
+
+    usage:
+    for start, deltas in iter_vertex_deltas(new_geo, original_geo, chunk_size=int):
+    start - index of the first vertex in this chunk.
+    deltas - (chunk, 3) numpy array of world space deltas.
     '''
 
-    ws_positions = []
+    vertex_count = cmds.polyEvaluate(str(new_geo), vertex=True)
+    original_count = cmds.polyEvaluate(str(original_geo), vertex=True)
+    if(vertex_count != original_count):
+        pm.error("{} has {} verts but {} has {}; vertex order/count must match.".format(
+            new_geo, vertex_count, original_geo, original_count))
 
-    # Maya will return pm.general.MeshVertex unless casted as a list.
-    print(list(new_geo.vtx))
-    vert_zip = zip(list(new_geo.vtx), list(original_geo.vtx))
+    chunk_count = (vertex_count + chunk_size - 1) // chunk_size
+    prg.start_progbar(max_value=chunk_count, message="Calculating Vertex Deltas...")
+    print("Streaming {} vert deltas in {} chunks...".format(vertex_count, chunk_count))
+
+    try:
+        for start, stop in dm.iter_chunks(vertex_count, chunk_size):
+            new_points = cmds.xform("{}.vtx[{}:{}]".format(new_geo, start, stop - 1), q=True, 
+                t=True, ws=True)
+            original_points = cmds.xform("{}.vtx[{}:{}]".format(original_geo, start, stop - 1), 
+                q=True, t=True, ws=True)
+            yield start, dm.point_deltas(new_points, original_points)
+            prg.update_progbar()
+    finally:
+        prg.end_progbar()
+
+
+def transfer_vertex_deltas(sculpt_geo, original_geo, target_geo, correspondence='triangle'):
+    '''
+    Carry the sculpt deltas between sculpt_geo and original_geo over to target_geo, which can have
+    completely different topology.  Each target vertex picks up the (interpolated) delta of the
+    spot it lands on over original_geo.
+
+    usage:
+    transfer_vertex_deltas(sculpt_geo, original_geo, target_geo, correspondence=[string])
+    sculpt_geo/original_geo - matching-topology pair the deltas are measured between.
+    target_geo - mesh to receive them.
+    correspondence - 'vertex' or 'triangle', see corresponding_points().
+
+    returns:
+    (T, 3) numpy array of deltas in target_geo's vertex order.
+    '''
 
-    prg.start_progbar(max_value = len(list(new_geo.vtx)), message="Calculating Vertex Deltas...")
-    print("Calculating {} vert deltas...".format(len(list(new_geo.vtx))))
-    for verts in vert_zip:
-        new_vert_pos = dt.Vector(pm.xform(verts[0], q=True, t=True, ws=True))
-        orig_vert_pos = dt.Vector(pm.xform(verts[1], q=True, t=True, ws=True))
-        ws_positions.append(new_vert_pos - orig_vert_pos)
-        prg.update_progbar()
+    original_points = get_points(original_geo)
+    deltas = dm.point_deltas(get_points(sculpt_geo), original_points)
 
-    prg.end_progbar()
+    triangle_vertices, barycentric = corresponding_points(
+        original_geo, get_points(target_geo), correspondence, original_points=original_points
+        )
 
-    return ws_positions
\ No newline at end of file
+    return spt.interpolate(deltas, triangle_vertices, barycentric)
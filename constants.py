@@ -7,6 +7,8 @@ There's a "generic" mapping, that is a go-between, so even our in-house standard
 in the tool.
 '''
 
+from .mapping_graph import MappingGraph
+
 # The generic map is a list of the keys for which other data sets connect.  This is INTENTIONALLY
 # different from our in-house standard.  The structure is a list of tuples, the first index being 
 # the generic joint name, and the second being a list of children-- a list of one item most times--
@@ -51,7 +53,7 @@ GENERIC_KEYS=[
     ('left_thumb_4', ['left_thumb_5']),
     ('left_thumb_5', []),
     ('right_clavicle', ['right_shoulder']),
-    ('right_shoulder', ['right_shoulder']),
+    ('right_shoulder', ['right_elbow']),
     ('right_elbow', ['right_wrist']),
     ('right_wrist', ['right_middle_0', 'right_pinky_0', 'right_ring_0', 'right_index_0', 'right_thumb_1']),
     ('right_pinky_0', ['right_pinky_1']),
@@ -178,4 +180,9 @@ SR_MAPPING={
     'right_ankle':'R_legAnkle_SHJnt',
     'right_ball':'R_footMid_SHJnt',
     'right_toe':''
-}
\ No newline at end of file
+}
+
+
+# GENERIC_KEYS and the mappings above compiled into dict lookups (see mapping_graph.py.)  Anything
+# inconsistent between them is listed in MAPPING_GRAPH.issues.
+MAPPING_GRAPH = MappingGraph(GENERIC_KEYS, mappings={'sr': SR_MAPPING})
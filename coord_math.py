@@ -6,6 +6,10 @@
 import pymel.core as pm
 import pymel.core.datatypes as dt
 import maya.api.OpenMaya as om
+import maya.cmds as cmds
+import numpy as np
+
+from . import vector_math as vm
 
 
 def get_component_ID(component):
@@ -28,6 +32,138 @@ def get_point_at_range(source_point, point):
     pass
     
 
+def reduce_points(points, weights=None, mode='mean'):
+    '''
+    Boil an (N, 3) array of points down to one centre point.
+
+    usage:
+    reduce_points(points, weights=[array], mode=[string])
+    weights - (optional) (N,) weights, like soft-selection influence.
+    mode - 'mean', 'median' (per axis) or 'bbox' (centre of the bounding box.)  Points with zero
+    weight are left out of 'median' and 'bbox'.
+
+    returns:
+    (3,) numpy array.
+    '''
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if(weights is not None):
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+        if(len(weights) != len(points)):
+            pm.error("Got {} weights for {} points.".format(len(weights), len(points)))
+        if(mode != 'mean'):
+            points = points[weights > 0.0]
+            weights = weights[weights > 0.0]
+
+    if(len(points) == 0):
+        pm.error("No points to find the centre of.")
+
+    if(mode == 'mean'):
+        if(weights is None):
+            return points.mean(axis=0)
+        return np.average(points, axis=0, weights=weights)
+
+    elif(mode == 'median'):
+        if(weights is None):
+            return np.median(points, axis=0)
+        # Weighted median: per axis, the first sorted value whose running weight reaches half.
+        order = np.argsort(points, axis=0)
+        running = np.cumsum(weights[order], axis=0)
+        half = running[-1] * 0.5
+        picks = np.argmax(running >= half, axis=0)
+        return points[order[picks, [0, 1, 2]], [0, 1, 2]]
+
+    elif(mode == 'bbox'):
+        return (points.min(axis=0) + points.max(axis=0)) * 0.5
+
+    pm.error("Bad mode {}; should be 'mean', 'median' or 'bbox'.".format(mode))
+
+
+def get_centroid(nodes, mode='mean', soft_select=False):
+    '''
+    Find the centre of a bunch of components and/or transforms in world space, reading every mesh's
+    points only once and never touching the viewport selection.
+
+    usage:
+    get_centroid(nodes, mode=[string], soft_select=[boolean])
+    nodes - list of string names or PyNodes (components like 'pCube1.vtx[0:99]', edges, faces or
+    transforms), or a dict of {mesh: vertex ids} or {mesh: (vertex ids, weights)}.
+    mode - see reduce_points().
+    soft_select - ignore nodes and use the current soft/rich selection, weighted by its falloff.
+
+    returns:
+    (3,) numpy array.
+    '''
+
+    point_chunks = []
+    weight_chunks = []
+    weighted = False
+    mesh_points = {}
+
+    def points_of(dag_path):
+        # One getPoints per mesh, no matter how many times it shows up.
+        key = dag_path.fullPathName()
+        if(key not in mesh_points):
+            mesh_points[key] = np.asarray(
+                om.MFnMesh(dag_path).getPoints(om.MSpace.kWorld), dtype=np.float64)[:, :3]
+        return mesh_points[key]
+
+    if(isinstance(nodes, dict)):
+        for mesh, ids in nodes.items():
+            selection = om.MSelectionList()
+            selection.add(str(mesh))
+            dag_path = selection.getDagPath(0)
+            dag_path.extendToShape()
+            if(isinstance(ids, tuple)):
+                ids, weights = ids
+                weighted = True
+            else:
+                weights = np.ones(len(ids))
+            point_chunks.append(points_of(dag_path)[np.asarray(ids, dtype=np.int64)])
+            weight_chunks.append(np.asarray(weights, dtype=np.float64))
+
+    else:
+        if(soft_select):
+            selection = om.MGlobal.getRichSelection().getSelection()
+            weighted = True
+        else:
+            # Edges and faces come in as their vertices.  An empty list would make
+            # polyListComponentConversion fall back to the active selection, so skip it then.
+            components = [str(node) for node in nodes if '.' in str(node)]
+            vertex_strings = []
+            if(components):
+                vertex_strings = cmds.polyListComponentConversion(components, toVertex=True) or []
+            selection = om.MSelectionList()
+            for name in vertex_strings + [str(node) for node in nodes if '.' not in str(node)]:
+                selection.add(name)
+
+        for i in range(selection.length()):
+            dag_path, component = selection.getComponent(i)
+
+            if(component.isNull()):
+                transform = om.MFnTransform(dag_path)
+                point_chunks.append(
+                    np.array([transform.translation(om.MSpace.kWorld)], dtype=np.float64))
+                weight_chunks.append(np.ones(1))
+                continue
+
+            component_fn = om.MFnSingleIndexedComponent(component)
+            ids = np.asarray(component_fn.getElements(), dtype=np.int64)
+            if(component_fn.hasWeights):
+                weights = np.array(
+                    [component_fn.weight(j).influence for j in range(len(ids))], dtype=np.float64)
+            else:
+                weights = np.ones(len(ids))
+            point_chunks.append(points_of(dag_path)[ids])
+            weight_chunks.append(weights)
+
+    if(not point_chunks):
+        pm.error("Nothing given to find the centre of.")
+
+    return reduce_points(np.concatenate(point_chunks), 
+        np.concatenate(weight_chunks) if weighted else None, mode=mode)
+
+
 def get_average_xform(nodes):
     '''
     Given a selection of components or trans nodes, find the average positon in world space.
@@ -35,70 +171,346 @@ def get_average_xform(nodes):
     usage:
     get_average_xform(nodes)
     nodes - list of string node names or PyNodes.
-    '''
-    
-    x_vals = []
-    y_vals = []
-    z_vals = []
-    # Find the average transform of all nodes selected
-    for node in nodes:
-
-        # Transfer the PyNodes incoming to MObjects using viewport selection (Yes I hate it too):
-        print ("Selecting {} and passing it to OM".format(node))
-        pm.select(node)
-        selection = om.MGlobal.getActiveSelectionList()
-        print (selection)
-        component_id = get_component_ID(selection)
-        meshDagPath = selection.getDagPath(0)
-        mFnMesh = om.MFnMesh(meshDagPath)
-        new_point = mFnMesh.getPoint(component_id[0], om.MSpace.kWorld)
-
-        print (new_point)
-        x_vals.append(new_point[0])
-        y_vals.append(new_point[1])
-        z_vals.append(new_point[2])
 
-    x_avg = sum(x_vals) / len(x_vals)
-    y_avg = sum(y_vals) / len(y_vals)
-    z_avg = sum(z_vals) / len(z_vals)
+    Kept for older callers-- see get_centroid() for weighted and median modes.
+    '''
 
-    return [x_avg, y_avg, z_avg]
+    return list(get_centroid(nodes).tolist())
 
 
 def get_normal(point_a, point_b, point_c):
     '''
     Returns the vector of the normal for triangle specified by the given three points.
+    See vector_math.normals for doing many triangles at once.
 
     usage:
     get_normal(point_a, point_b, point_c)
     point_a/b/c = a tuple with eulerian coordinates in it.
     '''
 
-    # Turn coord lists into vectors so the math is easy:
-    vec_a = dt.Vector(point_a)
-    vec_b = dt.Vector(point_b)
-    vec_c = dt.Vector(point_c)
-
-    normal = (vec_c - vec_a) * (vec_b - vec_a)
+    # The old dt.Vector version multiplied the edges, which is a dot product in pymel-- this is the
+    # actual cross product, not normalized.
+    normal = vm.normals(point_a, point_b, point_c, unit=False)[0]
 
-    return normal
+    return dt.Vector(normal.tolist())
 
 
 def get_vector(point_a, point_b):
     '''
     Given two Euler points in space, return the vector.
+    See vector_math.vectors for doing many pairs at once.
 
     usage:
     get_vector(point_a=[x,y,z], point_b=[x,y,z])
     Where x,y,z are Euler coords.
     '''
 
-    # Grab numpy vectors for after
-    vpoint_a = dt.Vector(point_a)
-    vpoint_b = dt.Vector(point_b)
-    vector = vpoint_a - vpoint_b
+    vector = vm.vectors(point_a, point_b)[0]
+
+    return dt.Vector(vector.tolist())
+
+
+def get_dag_paths(nodes):
+    '''
+    om2 MDagPaths for a list of string names or PyNodes, without touching the selection.  Repeats
+    are kept, so the result always lines up with nodes.
+    '''
+
+    selection = om.MSelectionList()
+    for node in nodes:
+        selection.add(str(node), False)
+
+    return [selection.getDagPath(i) for i in range(selection.length())]
+
+
+def get_world_matrices(nodes, dag_paths=None):
+    '''
+    World matrices of many nodes in one pass.
+
+    returns:
+    (N, 4, 4) numpy array (see vector_math for the layout.)
+    '''
+
+    if(dag_paths is None):
+        dag_paths = get_dag_paths(nodes)
+
+    return vm.as_matrices([list(dag_path.inclusiveMatrix()) for dag_path in dag_paths])
+
+
+def get_parent_matrices(nodes, dag_paths=None):
+    '''
+    World matrices of each node's parent (identity for children of the world) in one pass.
+
+    returns:
+    (N, 4, 4) numpy array.
+    '''
+
+    if(dag_paths is None):
+        dag_paths = get_dag_paths(nodes)
+
+    return vm.as_matrices([list(dag_path.exclusiveMatrix()) for dag_path in dag_paths])
+
+
+def _plug_vectors(dep_fns, attr):
+    # (N, 3) values of a compound double3 plug, in Maya's internal units (cm, radians.)
+    values = np.zeros((len(dep_fns), 3))
+    for i, dep_fn in enumerate(dep_fns):
+        plug = dep_fn.findPlug(attr, False)
+        values[i] = [plug.child(axis).asDouble() for axis in range(3)]
 
-    return vector
+    return values
+
+
+def get_transform_data(nodes, dag_paths=None):
+    '''
+    Everything besides translate/rotate/scale that goes into a transform's or joint's local matrix,
+    read for many nodes in one om2 pass.  Distances are in internal units (cm), like the matrices
+    from get_world_matrices.
+
+    returns:
+    (dict) 'rotate_order' (N,), 'rotate_axis' and 'joint_orient' (N, 3, 3) rotations (identity for
+    plain transforms), 'is_joint' (N,) booleans, 'inverse_scale' (N, 3) (the parent scale a
+    segmentScaleCompensate joint divides out, ones otherwise), and 'rotate_pivot',
+    'rotate_pivot_translate', 'scale_pivot', 'scale_pivot_translate' (N, 3).
+    '''
+
+    if(dag_paths is None):
+        dag_paths = get_dag_paths(nodes)
+    dep_fns = [om.MFnDependencyNode(dag_path.node()) for dag_path in dag_paths]
+    count = len(dep_fns)
+
+    is_joint = np.array([dag_path.hasFn(om.MFn.kJoint) for dag_path in dag_paths], dtype=bool)
+    joint_fns = [dep_fn for dep_fn, joint in zip(dep_fns, is_joint) if joint]
+
+    joint_orient = np.zeros((count, 3))
+    inverse_scale = np.ones((count, 3))
+    if(joint_fns):
+        joint_orient[is_joint] = _plug_vectors(joint_fns, 'jointOrient')
+        compensate = np.array([dep_fn.findPlug('segmentScaleCompensate', False).asBool() 
+            for dep_fn in joint_fns], dtype=bool)
+        inverse_scale[np.flatnonzero(is_joint)[compensate]] = _plug_vectors(
+            [dep_fn for dep_fn, on in zip(joint_fns, compensate) if on], 'inverseScale')
+
+    return {
+        'rotate_order': np.array([dep_fn.findPlug('rotateOrder', False).asInt() 
+            for dep_fn in dep_fns], dtype=np.int64),
+        'rotate_axis': vm.euler_to_matrix(_plug_vectors(dep_fns, 'rotateAxis'), 'xyz', 
+            degrees=False),
+        'joint_orient': vm.euler_to_matrix(joint_orient, 'xyz', degrees=False),
+        'is_joint': is_joint,
+        'inverse_scale': inverse_scale,
+        'rotate_pivot': _plug_vectors(dep_fns, 'rotatePivot'),
+        'rotate_pivot_translate': _plug_vectors(dep_fns, 'rotatePivotTranslate'),
+        'scale_pivot': _plug_vectors(dep_fns, 'scalePivot'),
+        'scale_pivot_translate': _plug_vectors(dep_fns, 'scalePivotTranslate'),
+        }
+
+
+def set_local_matrices(nodes, local_matrices, translate=True, rotate=True, scale=True, 
+    dag_paths=None):
+    '''
+    Write local (parent space) matrices onto transforms or joints as channel values.  Each node's
+    rotateOrder, rotateAxis, pivots and (for joints) jointOrient and segmentScaleCompensate are
+    respected and left as they are; only translate/rotate/scale are set.  Shear is assumed to be
+    zero.
+
+    Plain transforms follow Maya's SP^-1 S SP SPT RP^-1 RA R RP RPT T, joints S RA R JO IS T.  All
+    of that is read in one om2 pass (see get_transform_data) and solved in numpy; the writes are
+    still one setAttr per channel so they can be undone, all in a single undo chunk.
+
+    usage:
+    set_local_matrices(nodes, local_matrices, translate=[boolean], rotate=[boolean], 
+        scale=[boolean], dag_paths=[list])
+    local_matrices - (N, 4, 4) array, one per node.
+    translate/rotate/scale - which channels to write.
+    dag_paths - (optional) MDagPaths of nodes if they've been looked up already.
+    '''
+
+    local_matrices = vm.as_matrices(local_matrices).copy()
+    names = [str(node) for node in nodes]
+    data = get_transform_data(names, dag_paths=dag_paths)
+    is_joint = data['is_joint']
+
+    # A compensating joint's matrix ends in IS = (parent scale)^-1 before T; take it back out.
+    local_matrices[is_joint, :3, :3] = (local_matrices[is_joint, :3, :3] * 
+        data['inverse_scale'][is_joint, None, :])
+
+    rotations, scales, translates = vm.decompose_matrices(local_matrices)
+
+    # Transforms: the local translation is T plus where the pivots put the origin.
+    pivot_offset = data['scale_pivot'] - data['scale_pivot'] * scales
+    pivot_offset += data['scale_pivot_translate'] - data['rotate_pivot']
+    pivot_offset = np.einsum('ni,nij->nj', pivot_offset, rotations)
+    pivot_offset += data['rotate_pivot'] + data['rotate_pivot_translate']
+    translates[~is_joint] -= pivot_offset[~is_joint]
+    translates *= om.MDistance.internalToUI(1.0)
+
+    if(rotate):
+        # local rotation = RA @ R @ JO, so peel off the rotate axis and joint orient.
+        bare = (np.swapaxes(data['rotate_axis'], 1, 2) @ rotations @ 
+            np.swapaxes(data['joint_orient'], 1, 2))
+        rotate_orders = data['rotate_order']
+        eulers = np.zeros((len(names), 3))
+        for order in np.unique(rotate_orders):
+            same = rotate_orders == order
+            eulers[same] = vm.matrix_to_euler(bare[same], int(order))
+
+    cmds.undoInfo(openChunk=True)
+    try:
+        for i, name in enumerate(names):
+            if(translate):
+                cmds.setAttr(name + '.translate', *translates[i].tolist())
+            if(rotate):
+                cmds.setAttr(name + '.rotate', *eulers[i].tolist())
+            if(scale):
+                cmds.setAttr(name + '.scale', *scales[i].tolist())
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+    return
+
+
+def solve_local_matrices(dag_paths, old_world, new_world, parent_world=None):
+    '''
+    Local matrices that put each node at its new world matrix.  A node whose ancestor is in the
+    same batch is solved against that ancestor's new matrix, so whole hierarchies can be moved in
+    one pass without reparenting anything.
+
+    usage:
+    solve_local_matrices(dag_paths, old_world, new_world, parent_world=[array])
+    old_world/new_world - (N, 4, 4) current and wanted world matrices, in dag_paths order.
+    parent_world - (optional) current parent world matrices if they've been read already.
+
+    returns:
+    (N, 4, 4) numpy array.
+    '''
+
+    if(parent_world is None):
+        parent_world = get_parent_matrices(None, dag_paths=dag_paths)
+    parent_world = vm.as_matrices(parent_world).copy()
+
+    # Carry the nearest moved ancestor's change down to each parent matrix.
+    full_paths = [dag_path.fullPathName() for dag_path in dag_paths]
+    path_index = dict((path, i) for i, path in enumerate(full_paths))
+    for i, full_path in enumerate(full_paths):
+        ancestor_path = full_path.rsplit('|', 1)[0]
+        while(ancestor_path):
+            if(ancestor_path in path_index):
+                ancestor = path_index[ancestor_path]
+                parent_world[i] = (parent_world[i] @ np.linalg.inv(old_world[ancestor]) @ 
+                    new_world[ancestor])
+                break
+            ancestor_path = ancestor_path.rsplit('|', 1)[0]
+
+    return vm.as_matrices(new_world) @ vm.inverse(parent_world)
+
+
+def set_joint_orients(joints, local_matrices, keep_rotate=True, translate=True, dag_paths=None):
+    '''
+    Write local matrices onto joints through their jointOrient, the way a joint is "oriented" rather
+    than rotated.  Scale is left alone.  rotateAxis, rotateOrder and segmentScaleCompensate come
+    from one om2 pass (see get_transform_data), and the writes go in a single undo chunk.
+
+    usage:
+    set_joint_orients(joints, local_matrices, keep_rotate=[boolean], translate=[boolean], 
+        dag_paths=[list])
+    keep_rotate - leave the rotate channels as they are and solve jointOrient around them.  When
+    False rotate is zeroed and everything goes into jointOrient.
+    translate - also write translate.
+    dag_paths - (optional) MDagPaths of joints if they've been looked up already.
+    '''
+
+    local_matrices = vm.as_matrices(local_matrices).copy()
+    names = [str(joint) for joint in joints]
+    if(dag_paths is None):
+        dag_paths = get_dag_paths(names)
+    data = get_transform_data(names, dag_paths=dag_paths)
+
+    # S RA R JO IS T: take the parent scale a compensating joint divides out back out first, or it
+    # ends up in the rotation.
+    local_matrices[:, :3, :3] = local_matrices[:, :3, :3] * data['inverse_scale'][:, None, :]
+    rotations, _, translates = vm.decompose_matrices(local_matrices)
+    translates *= om.MDistance.internalToUI(1.0)
+
+    if(keep_rotate):
+        rotates = _plug_vectors([om.MFnDependencyNode(dag_path.node()) for dag_path in dag_paths], 
+            'rotate')
+        rotate_orders = data['rotate_order']
+        current = np.zeros((len(names), 3, 3))
+        for order in np.unique(rotate_orders):
+            same = rotate_orders == order
+            current[same] = vm.euler_to_matrix(rotates[same], int(order), degrees=False)
+        # local rotation = RA @ R @ JO
+        current = data['rotate_axis'] @ current
+    else:
+        current = data['rotate_axis']
+
+    joint_orients = vm.matrix_to_euler(np.swapaxes(current, 1, 2) @ rotations, 'xyz')
+
+    cmds.undoInfo(openChunk=True)
+    try:
+        for i, name in enumerate(names):
+            if(not keep_rotate):
+                cmds.setAttr(name + '.rotate', 0.0, 0.0, 0.0)
+            cmds.setAttr(name + '.jointOrient', *joint_orients[i].tolist())
+            if(translate):
+                cmds.setAttr(name + '.translate', *translates[i].tolist())
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+    return
+
+
+def match_xforms(pairs, rotate=True, scale=False):
+    '''
+    match_xforms
+    Batch version of match_xform: snaps every subject to its target with one read pass over the
+    world matrices, vectorized parent-inverse math, and one write pass.
+
+    A subject whose ancestor is also being matched is solved against that ancestor's new position,
+    so whole hierarchies can be matched in one call.
+
+    usage:
+    match_xforms([(target_node, subject_node), ...], rotate=[boolean], scale=[boolean])
+    rotate - also match world orientation.
+    scale - also match world scale.
+    '''
+
+    pairs = list(pairs)
+    if(not pairs):
+        return
+
+    targets = [pair[0] for pair in pairs]
+    subjects = [pair[1] for pair in pairs]
+
+    subject_paths = get_dag_paths(subjects)
+    target_paths = get_dag_paths(targets)
+    target_world = get_world_matrices(targets, dag_paths=target_paths)
+    subject_world = get_world_matrices(subjects, dag_paths=subject_paths)
+    parent_world = get_parent_matrices(subjects, dag_paths=subject_paths)
+
+    # The world matrix each subject should end up with.
+    target_rot, target_scale, _ = vm.decompose_matrices(target_world)
+    subject_rot, subject_scale, _ = vm.decompose_matrices(subject_world)
+    new_rot = target_rot if rotate else subject_rot
+    new_scale = target_scale if scale else subject_scale
+    new_axes = new_scale[:, :, None] * new_rot
+
+    # Line the rotate pivots up, like matchTransform does (with zeroed pivots that's just the
+    # origins.)  Pivots are object space points, so they go through the world matrices.
+    target_pivot = get_transform_data(targets, dag_paths=target_paths)['rotate_pivot']
+    subject_pivot = get_transform_data(subjects, dag_paths=subject_paths)['rotate_pivot']
+    pivot_world = np.einsum('ni,nij->nj', target_pivot, target_world[:, :3, :3])
+    pivot_world += target_world[:, 3, :3]
+    new_translates = pivot_world - np.einsum('ni,nij->nj', subject_pivot, new_axes)
+
+    new_world = vm.compose_matrices(*np.swapaxes(new_axes, 0, 1), translates=new_translates)
+
+    local_matrices = solve_local_matrices(subject_paths, subject_world, new_world, parent_world)
+    set_local_matrices(subjects, local_matrices, rotate=rotate, scale=scale, 
+        dag_paths=subject_paths)
+
+    return
 
 
 def match_xform(target_node, subject_node, rotate=True):
@@ -111,20 +523,6 @@ def match_xform(target_node, subject_node, rotate=True):
     match_xform(target_node=[string or PyNode], subject_node=[string or PyNode], rotate=[boolean])
     '''
 
-    # Get details from the target_node.
-    #targetRotOrder = pm.getAttr(target_node.rotateOrder)
-    target_rot = pm.xform( target_node, q=True, ws=True, ro=True )
-    target_trans = pm.xform( target_node, q=True, ws=True, t=True )
-    #targetRotPivot = pm.xform( target_node, q=True, ws=True, rp=True )
-
-    # I've been warned about the ws flags behaving deceptively.
-    pm.xform( subject_node, ws=True, t=target_trans )
+    match_xforms([(target_node, subject_node)], rotate=rotate)
 
-    if(rotate):
-        pm.xform( subject_node, ws=True, ro=target_rot )
-    
     return 
-
-
-    
-
@@ -0,0 +1,455 @@
+'''
+datablock.py
+
+Columnar storage for the skeleton "datablock" fbx_utils.import_skeleton makes: one numpy structured
+array with a row per node, instead of a list of dicts.
+
+Datablocks save to compressed .npz files, and DatablockCache keeps them by the sha1 of the FBX they
+came from, so an unchanged FBX never has to be imported twice.
+
+Anything that still expects the old (list of dicts, duplicate names) tuple can keep using it--
+a Datablock unpacks and indexes the same way (see Datablock.as_dicts.)
+
+No Maya imports in here on purpose.
+'''
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from . import vector_math as vm
+
+# Bump this whenever DATABLOCK_DTYPE or the cache index changes, so old cache files are ignored
+# instead of misread.
+FORMAT_VERSION = 2
+
+# What made a cached datablock.  A real Maya import and fbx_reader's approximation of one are kept
+# apart in the cache, so neither is ever handed out in place of the other.
+MAYA_PRODUCER = 'maya'
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), 'sr_datablock_cache')
+
+DATABLOCK_DTYPE = np.dtype([
+    ('name', 'U128'),
+    ('full_name', 'U1024'),
+    ('node_type', 'U16'),
+    ('parent', 'i4'),
+    ('parent_name', 'U128'),
+    ('translate', 'f8', (3,)),
+    ('rotate', 'f8', (3,)),
+    ('scale', 'f8', (3,)),
+    ('joint_orient', 'f8', (3,)),
+    ('rotate_order', 'i1'),
+    ('world_space_pos', 'f8', (3,)),
+    ])
+
+
+def short_name(full_name):
+    '''
+    '|grp|match_import:hips' -> 'match_import:hips'.
+    '''
+
+    return str(full_name).rsplit('|', 1)[-1]
+
+
+class NameIndex:
+    '''
+    Short name to full name multimap for a set of nodes, built in one pass, so every collision is
+    known at once instead of asking the scene node by node.
+
+    Each node also gets a stable unique key: the path of sibling positions down from its root, like
+    '0/2/1' (first root, its third child, that one's second child.)  The same file harvested the
+    same way always gives the same keys, so nodes can be looked up without ambiguous names.
+
+    usage:
+    names = NameIndex(full_names, parents=[list])
+    full_names - full DAG path of each node.
+    parents - (optional) parent row of each node, -1 for roots.  Worked out from the full names if
+    it isn't given.
+    '''
+
+    def __init__(self, full_names, parents=None):
+        self.full_names = [str(full_name) for full_name in full_names]
+        self.short_names = [short_name(full_name) for full_name in self.full_names]
+        self._path_rows = dict((full_name, row) for row, full_name in enumerate(self.full_names))
+
+        if(parents is None):
+            parents = [self._path_rows.get(full_name.rsplit('|', 1)[0], -1)
+                for full_name in self.full_names]
+        self.parents = [int(parent) for parent in parents]
+
+        self._short_rows = {}
+        for row, name in enumerate(self.short_names):
+            self._short_rows.setdefault(name, []).append(row)
+
+        # Sibling positions, in row order.
+        child_count = {}
+        position = []
+        for parent in self.parents:
+            position.append(child_count.get(parent, 0))
+            child_count[parent] = position[-1] + 1
+
+        self.keys = [None] * len(self.full_names)
+        for row in range(len(self.full_names)):
+            chain = []
+            node = row
+            while(node >= 0):
+                if(self.keys[node] is not None):
+                    chain.append(self.keys[node])
+                    break
+                chain.append(str(position[node]))
+                node = self.parents[node]
+            self.keys[row] = '/'.join(reversed(chain))
+        self._key_rows = dict((key, row) for row, key in enumerate(self.keys))
+
+    def __len__(self):
+        return len(self.full_names)
+
+    def collisions(self):
+        '''
+        {short name: [full names]} for every short name used by more than one node.
+        '''
+
+        return dict((name, [self.full_names[row] for row in rows])
+            for name, rows in self._short_rows.items() if len(rows) > 1)
+
+    def duplicates(self):
+        '''
+        Sorted short names used by more than one node.
+        '''
+
+        return sorted(name for name, rows in self._short_rows.items() if len(rows) > 1)
+
+    def rows(self, name):
+        '''
+        Every row a full name, key or short name could mean.
+        '''
+
+        name = str(name)
+        if(name in self._path_rows):
+            return [self._path_rows[name]]
+        if(name in self._key_rows):
+            return [self._key_rows[name]]
+
+        return list(self._short_rows.get(short_name(name), []))
+
+    def row(self, name):
+        '''
+        The one row for a full name, key or short name.  Raises KeyError if there isn't one, or if
+        the short name belongs to more than one node.
+        '''
+
+        rows = self.rows(name)
+        if(len(rows) == 1):
+            return rows[0]
+        if(len(rows) > 1):
+            raise KeyError("{} matches {} nodes: {}".format(name, len(rows),
+                [self.full_names[row] for row in rows]))
+        raise KeyError("{} isn't in this name index.".format(name))
+
+    def report(self):
+        '''
+        Print every collision, and return them.
+        '''
+
+        collisions = self.collisions()
+        for name, full_names in sorted(collisions.items()):
+            print("'{}' is used by {} nodes: {}".format(name, len(full_names), full_names))
+        if(not collisions):
+            print("No duplicate names.")
+
+        return collisions
+
+
+class Datablock:
+    '''
+    A skeleton's nodes as columns.
+
+    usage:
+    block = Datablock(records, duplicates=[list])
+    records - structured array of DATABLOCK_DTYPE (or anything np.asarray turns into one.)  'parent'
+    is the row of each node's parent, or -1 when the parent isn't in the block (its name is still
+    in 'parent_name'.)
+    duplicates - (optional) short names that were found more than once.  Worked out from the
+    records (see NameIndex) when it isn't given.
+
+    block.records['world_space_pos'] is an (N, 3) array, and so on for every field.
+    block.keys are the unique keys (see NameIndex) to look nodes up by instead of names.
+    '''
+
+    def __init__(self, records, duplicates=None):
+        self.records = np.asarray(records, dtype=DATABLOCK_DTYPE).reshape(-1)
+        self._dicts = None
+        self._name_index = None
+        self.duplicates = (list(duplicates) if duplicates is not None else
+            self.name_index().duplicates())
+
+    def __len__(self):
+        return len(self.records)
+
+    # The old datablock was a (dicts, duplicates) tuple, so keep datablock[0] and unpacking working.
+    def __getitem__(self, item):
+        return (self.as_dicts(), self.duplicates)[item]
+
+    def __iter__(self):
+        return iter((self.as_dicts(), self.duplicates))
+
+    @property
+    def names(self):
+        return self.records['name'].tolist()
+
+    @property
+    def parents(self):
+        return self.records['parent'].astype(np.int64)
+
+    @property
+    def keys(self):
+        return self.name_index().keys
+
+    def name_index(self):
+        '''
+        NameIndex of the records, built the first time it's asked for.
+        '''
+
+        if(self._name_index is None):
+            self._name_index = NameIndex(self.records['full_name'].tolist(),
+                parents=self.records['parent'].tolist())
+
+        return self._name_index
+
+    def children(self):
+        '''
+        List of child rows for every row.
+        '''
+
+        children = [[] for _ in range(len(self))]
+        for row, parent in enumerate(self.records['parent']):
+            if(parent >= 0):
+                children[parent].append(row)
+
+        return children
+
+    def as_dicts(self):
+        '''
+        The old list-of-dicts view, the same keys fbx_utils.get_joint_data gives, plus 'key' and
+        'parent_key' (see NameIndex; parent_key is None when the parent isn't in the block.)
+        Built once and kept, so edits to the dicts (like translate_from_scene's 'match') stick
+        around.
+        '''
+
+        if(self._dicts is not None):
+            return self._dicts
+
+        names = self.names
+        keys = self.keys
+        children = self.children()
+        self._dicts = []
+        for row, record in enumerate(self.records):
+            joint_dict = {
+                'nodeType': str(record['node_type']),
+                'name': names[row],
+                'full_name': str(record['full_name']),
+                'parent': str(record['parent_name']) or None,
+                'children': [names[child] for child in children[row]] or None,
+                'world_space_pos': record['world_space_pos'].tolist(),
+                'key': keys[row],
+                'parent_key': keys[record['parent']] if record['parent'] >= 0 else None,
+                }
+            for prefix, field in [('t', 'translate'), ('r', 'rotate'), ('s', 'scale')]:
+                for axis, value in zip('xyz', record[field].tolist()):
+                    joint_dict[prefix + axis] = value
+            if(record['node_type'] == 'joint'):
+                joint_dict['rotate_order'] = vm.ROTATE_ORDERS[int(record['rotate_order'])]
+                joint_dict['jointOrient'] = record['joint_orient'].tolist()
+            self._dicts.append(joint_dict)
+
+        return self._dicts
+
+    @classmethod
+    def from_dicts(cls, joint_dicts, duplicates=None):
+        '''
+        Build one from the old list of dicts.
+        '''
+
+        records = np.zeros(len(joint_dicts), dtype=DATABLOCK_DTYPE)
+        rows = dict((joint_dict['name'], row) for row, joint_dict in enumerate(joint_dicts))
+        for row, joint_dict in enumerate(joint_dicts):
+            records[row]['name'] = joint_dict['name']
+            records[row]['full_name'] = joint_dict.get('full_name') or joint_dict['name']
+            records[row]['node_type'] = joint_dict.get('nodeType', 'joint')
+            records[row]['parent_name'] = joint_dict.get('parent') or ''
+            records[row]['parent'] = rows.get(joint_dict.get('parent'), -1)
+            records[row]['translate'] = [joint_dict.get('t' + axis, 0.0) for axis in 'xyz']
+            records[row]['rotate'] = [joint_dict.get('r' + axis, 0.0) for axis in 'xyz']
+            records[row]['scale'] = [joint_dict.get('s' + axis, 1.0) for axis in 'xyz']
+            records[row]['joint_orient'] = joint_dict.get('jointOrient', (0.0, 0.0, 0.0))
+            order = joint_dict.get('rotate_order', 0)
+            records[row]['rotate_order'] = (vm.ROTATE_ORDERS.index(order) if isinstance(order, str)
+                else int(order))
+            records[row]['world_space_pos'] = joint_dict['world_space_pos']
+
+        return cls(records, duplicates=duplicates)
+
+    def save(self, file_path):
+        '''
+        Write the datablock to a compressed .npz file.
+        '''
+
+        with open(file_path, 'wb') as fp:
+            np.savez_compressed(fp, records=self.records,
+                duplicates=np.array(self.duplicates, dtype=str),
+                version=np.array(FORMAT_VERSION))
+
+    @classmethod
+    def load(cls, file_path):
+        '''
+        Read a datablock written by save().  Raises ValueError if it was written in another format
+        version.
+        '''
+
+        with np.load(file_path, allow_pickle=False) as data:
+            version = int(data['version'])
+            if(version != FORMAT_VERSION):
+                raise ValueError("{} is datablock format {}, expected {}.".format(file_path,
+                    version, FORMAT_VERSION))
+
+            return cls(data['records'], duplicates=data['duplicates'].tolist())
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    '''
+    sha1 hex digest of a file's contents, read in chunks.
+    '''
+
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class DatablockCache:
+    '''
+    A folder of saved datablocks, keyed by the sha1 of the FBX they were harvested from and by
+    what harvested them, with an index.json next to them.  The index also remembers each source
+    path's size and mtime, so an untouched file is found without hashing it again.
+
+    usage:
+    cache = DatablockCache(directory=[string], producer=[string])
+    datablock = cache.get(fbx_path) # None if it isn't cached
+    cache.put(fbx_path, datablock)
+    cache.put(fbx_path, datablock, write_index=False) # many puts, then...
+    cache.flush() # ...write index.json once
+    producer - what this cache's datablocks come from: MAYA_PRODUCER for fbx_utils.import_skeleton,
+    fbx_reader.CACHE_PRODUCER for the Maya-free reader.  get() only returns blocks put by the same
+    producer.
+    '''
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, producer=MAYA_PRODUCER):
+        self.directory = directory
+        self.producer = producer
+        self.index_path = os.path.join(directory, 'index.json')
+        self._index = None
+        self._dirty = False
+        # (path, size, mtime) -> sha1 for files hashed by this cache, so get() followed by put()
+        # reads the file once.
+        self._hashes = {}
+
+    def _load_index(self):
+        if(self._index is None):
+            self._index = {'version': FORMAT_VERSION, 'blocks': {}, 'sources': {}}
+            if(os.path.isfile(self.index_path)):
+                with open(self.index_path) as fp:
+                    index = json.load(fp)
+                if(index.get('version') == FORMAT_VERSION):
+                    self._index = index
+
+        return self._index
+
+    def flush(self):
+        '''
+        Write index.json if any put() since the last write left it out of date.
+        '''
+
+        if(not self._dirty):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            json.dump(self._index, fp, sort_keys=True, indent=4)
+        os.replace(temp_path, self.index_path)
+        self._dirty = False
+
+    def key(self, file_path):
+        '''
+        The content hash of file_path, reusing the last one if its size and mtime haven't changed.
+        '''
+
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        known = self._load_index()['sources'].get(file_path)
+        if(known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime):
+            return known['sha1']
+
+        state = (file_path, stat.st_size, stat.st_mtime)
+        if(state not in self._hashes):
+            self._hashes[state] = file_hash(file_path)
+
+        return self._hashes[state]
+
+    def _block_name(self, sha1):
+        return '{}.{}'.format(sha1, self.producer)
+
+    def get(self, file_path):
+        '''
+        The cached datablock for file_path's contents, or None.
+        '''
+
+        entry = self._load_index()['blocks'].get(self._block_name(self.key(file_path)))
+        if(entry is None or entry.get('producer') != self.producer):
+            return None
+
+        block_path = os.path.join(self.directory, entry['file'])
+        if(not os.path.isfile(block_path)):
+            return None
+
+        return Datablock.load(block_path)
+
+    def put(self, file_path, datablock, sha1=None, write_index=True):
+        '''
+        Save a datablock for file_path's contents and record it in the index.
+
+        usage:
+        put(file_path, datablock, sha1=[string], write_index=[boolean])
+        sha1 - (optional) content hash of file_path if the caller has it; otherwise key() gives it,
+        without reading the file again if get() already hashed it.
+        write_index - False to leave index.json for a later flush(), when putting many files.
+
+        returns:
+        The content hash it was stored under.
+        '''
+
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        if(sha1 is None):
+            sha1 = self.key(file_path)
+
+        os.makedirs(self.directory, exist_ok=True)
+        block_name = self._block_name(sha1) + '.npz'
+        temp_path = os.path.join(self.directory, block_name + '.tmp')
+        datablock.save(temp_path)
+        os.replace(temp_path, os.path.join(self.directory, block_name))
+
+        index = self._load_index()
+        index['blocks'][self._block_name(sha1)] = {'file': block_name, 'source': file_path,
+            'producer': self.producer, 'nodes': len(datablock)}
+        index['sources'][file_path] = {'sha1': sha1, 'size': stat.st_size,
+            'mtime': stat.st_mtime}
+        self._dirty = True
+        if(write_index):
+            self.flush()
+
+        return sha1
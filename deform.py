@@ -9,30 +9,336 @@ Operations related to deformations
 '''
 
 from . import component as cmp
+from . import delta_math as dm
 from . import progbar as prg
 
+from concurrent import futures
+import time
+
 import pymel.core as pm
+import maya.cmds as cmds
+import numpy as np
+
+# Control points are written in runs; this caps how many go into a single setAttr call.
+TWEAK_WRITE_RUN = 10000
+
+
+def write_tweak_deltas(tweak, deltas, indices=None, epsilon=1e-6, max_run=TWEAK_WRITE_RUN):
+    '''
+    Bulk-writes vertex deltas into the control points of a tweak node.
+
+    Consecutive vertices are grouped and written with one multi-element setAttr per run, instead of
+    three plug sets per vertex.  Vertices with a delta at or below epsilon are skipped entirely, and
+    keep whatever value the tweak already had-- so only use this on a clean tweak, or reset_tweak()
+    first (deltas_to_tweak does.)
+
+    usage:
+    write_tweak_deltas(tweak, deltas, indices=[array], epsilon=float, max_run=int)
+    tweak - string name or PyNode of the tweak node.
+    deltas - (N, 3) array-like of deltas.
+    indices - (optional) vertex index of each row in deltas, for sparse data.  Without it, row i is
+    vertex i.
+    epsilon - skip threshold for the length of a delta.
+    max_run - most control points written by a single setAttr call.
+
+    returns:
+    (int) Number of control point plugs written.
+    '''
+
+    deltas = dm.as_points(deltas)
+
+    if(indices is None):
+        indices = dm.significant_indices(deltas, epsilon)
+        values = deltas[indices]
+    else:
+        indices = np.asarray(indices, dtype=np.int64)
+        if(len(indices) != len(deltas)):
+            pm.error("Got {} indices for {} deltas.".format(len(indices), len(deltas)))
+        keep = dm.significant_indices(deltas, epsilon)
+        order = np.argsort(indices[keep], kind='stable')
+        indices = indices[keep][order]
+        values = deltas[keep][order]
+
+    runs = dm.contiguous_runs(indices, max_run=max_run)
+    if(not runs):
+        print("No deltas above {} to write to {}.".format(epsilon, tweak))
+        return 0
+
+    prg.start_progbar(max_value=len(runs), message="Baking Deltas to Tweak node...")
+    _write_runs(tweak, runs, values, progress=True)
+    prg.end_progbar()
+
+    print("Wrote {} control points to {} in {} setAttr calls.".format(len(indices), tweak,
+        len(runs)))
+
+    return len(indices)
+
+
+def _write_runs(tweak, runs, values, progress=False):
+    '''
+    Writes sorted values to the tweak, one setAttr per (start, stop) run.
+    '''
+
+    position = 0
+    for start, stop in runs:
+        count = stop - start
+        flat_values = values[position:position + count].ravel().tolist()
+        cmds.setAttr(
+            "{}.plist[0].controlPoints[{}:{}]".format(tweak, start, stop - 1), *flat_values
+            )
+        position += count
+        if(progress):
+            prg.update_progbar()
+
 
-def deltas_to_tweak(new_geo, old_geo, tweak):
+def reset_tweak(tweak, max_run=TWEAK_WRITE_RUN):
+    '''
+    Zero every control point the tweak already has set, in runs, so a sparse write afterwards
+    doesn't leave old offsets behind on vertices it skips.
+
+    usage:
+    reset_tweak(tweak, max_run=int)
+
+    returns:
+    (int) Number of control points zeroed.
+    '''
+
+    indices = cmds.getAttr("{}.plist[0].controlPoints".format(tweak), multiIndices=True)
+    if(not indices):
+        return 0
+
+    indices = np.unique(np.asarray(indices, dtype=np.int64))
+    _write_runs(tweak, dm.contiguous_runs(indices, max_run=max_run), np.zeros((len(indices), 3)))
+
+    return len(indices)
+
+
+def write_tweak_stream(tweak, stream, epsilon=1e-6, max_run=TWEAK_WRITE_RUN):
+    '''
+    Write (start, deltas_chunk) blocks to a tweak node as they arrive, so the full delta array never
+    has to exist at once.  Takes the generator from component.iter_vertex_deltas directly.
+
+    usage:
+    write_tweak_stream(tweak, stream, epsilon=float, max_run=int)
+
+    returns:
+    (int) Number of control point plugs written.
+    '''
+
+    written = 0
+    for start, chunk in stream:
+        indices = dm.significant_indices(chunk, epsilon)
+        runs = dm.contiguous_runs(indices + start, max_run=max_run)
+        _write_runs(tweak, runs, dm.as_points(chunk)[indices])
+        written += len(indices)
+
+    print("Wrote {} control points to {}.".format(written, tweak))
+
+    return written
+
+
+def deltas_to_tweak(new_geo, old_geo, tweak, epsilon=1e-6, chunk_size=None):
     '''
     Applies a list of vertex deltas, generated by component.list_vertex_deltas() to the inside
     of a tweak node.
+
+    usage:
+    deltas_to_tweak(new_geo, old_geo, tweak, epsilon=float, chunk_size=int)
+    epsilon - vertices that moved less than this end up at zero on the tweak; whatever the tweak
+    held before is reset first.
+    chunk_size - stream the deltas in blocks of this many vertices to keep memory bounded on huge
+    meshes.
+
+    returns:
+    (int) Number of control point plugs written.
+    '''
+
+    reset = reset_tweak(tweak)
+    if(reset):
+        print("Reset {} existing control points on {}.".format(reset, tweak))
+
+    if(chunk_size is not None):
+        stream = cmp.iter_vertex_deltas(new_geo, old_geo, chunk_size=chunk_size)
+        written = write_tweak_stream(tweak, stream, epsilon=epsilon)
+    else:
+        deltas = cmp.list_vertex_deltas(new_geo, old_geo)
+        written = write_tweak_deltas(tweak, deltas, epsilon=epsilon)
+
+    print("Vertex deltas from {} are now baked to {}.".format(new_geo, tweak))
+
+    return written
+
+
+def save_delta_file(new_geo, old_geo, file_path, epsilon=1e-6, half=False):
+    '''
+    Measure the deltas between two meshes and store only the vertices that moved in a compressed
+    .npz (see delta_math.save_sparse_deltas for the layout.)  The topology fingerprint of old_geo
+    goes in the header, so the file can be checked against whatever mesh it's applied to later.
+
+    usage:
+    save_delta_file(new_geo, old_geo, file_path, epsilon=float, half=[boolean])
+    half - store offsets as float16 instead of float32, roughly halving the file size.
+
+    returns:
+    (int) Number of vertices stored.
     '''
 
     deltas = cmp.list_vertex_deltas(new_geo, old_geo)
+    indices, offsets = dm.sparsify(deltas, epsilon)
 
-    prg.start_progbar(max_value=len(deltas), message="Baking Deltas to Tweak node...")
+    dm.save_sparse_deltas(
+        file_path, indices, offsets, vertex_count=len(deltas), 
+        fingerprint=cmp.get_topology_fingerprint(old_geo), half=half, name=str(new_geo)
+        )
+    print("Wrote {} of {} vertex deltas from {} to {}".format(len(indices), len(deltas), new_geo,
+        file_path))
 
-    for i in range(0, len(deltas)):
-        tweak_vert = tweak.plist[0].controlPoints[i]
-        tweak_vert.xValue.set(deltas[i][0])
-        tweak_vert.yValue.set(deltas[i][1])
-        tweak_vert.zValue.set(deltas[i][2])
-        prg.update_progbar()
+    return len(indices)
 
-    prg.end_progbar()
 
-    print("Vertex deltas from {} are now baked to {}.".format(new_geo.name(), tweak))
+def load_delta_file(file_path):
+    '''
+    Load a delta file written by save_delta_file().
+
+    returns:
+    (dict) with 'indices', 'offsets', 'vertex_count', 'fingerprint' and 'name' keys.
+    '''
+
+    return dm.load_sparse_deltas(file_path)
+
+
+def apply_delta_file(file_path, tweak, geo=None, epsilon=0.0, reset=True):
+    '''
+    Bake a stored delta file onto a tweak node.  The sculpt mesh it was made from doesn't need to be
+    in the scene.
+
+    usage:
+    apply_delta_file(file_path, tweak, geo=[mesh], epsilon=float, reset=[boolean])
+    geo - (optional) the mesh the tweak deforms.  When given, its topology must match the
+    fingerprint stored in the file or nothing is written.
+    reset - zero the tweak first (see reset_tweak), so re-applying a file doesn't leave old offsets
+    on the vertices it doesn't store.  Turn it off to layer the file over what's already there.
+
+    returns:
+    (int) Number of control point plugs written.
+    '''
+
+    delta_data = load_delta_file(file_path)
+
+    if(geo is not None):
+        fingerprint = cmp.get_topology_fingerprint(geo)
+        if(fingerprint != delta_data['fingerprint']):
+            pm.error("{} was saved from a mesh with different topology than {}.".format(file_path,
+                geo))
+
+    if(reset):
+        reset_tweak(tweak)
+
+    return write_tweak_deltas(tweak, delta_data['offsets'], indices=delta_data['indices'], 
+        epsilon=epsilon)
+
+
+def bake_deltas_batch(manifest, epsilon=1e-6, workers=None, processes=False):
+    '''
+    Bakes many mesh pairs to their tweak nodes in one go.
+
+    Point buffers are read from Maya one mesh at a time (Maya's API isn't thread safe), the diffing
+    and thresholding runs in a pool while the next pair is being read, and results are written back
+    to the tweaks one at a time as they come in.
+
+    usage:
+    bake_deltas_batch([(new_geo, old_geo, tweak), ...], epsilon=float, workers=int, 
+        processes=[boolean])
+    manifest - iterable of (new_geo, old_geo, tweak) triples.
+    workers - pool size, defaults to the executor's own choice.
+    processes - use a process pool instead of threads.  Only worth it from mayapy; inside the GUI
+    each worker would be a fresh Maya executable.
+
+    returns:
+    List of dicts, one per triple, with 'new_geo', 'old_geo', 'tweak', 'vertices', 'written',
+    'read_time', 'compute_time', 'write_time' (seconds) and 'error'.  A pair whose vertex counts
+    don't match is skipped with the reason in 'error', and the rest of the manifest still bakes.
+    '''
+
+    if(processes):
+        executor = futures.ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = futures.ThreadPoolExecutor(max_workers=workers)
+
+    report = []
+    jobs = []
+    with executor:
+        for new_geo, old_geo, tweak in manifest:
+            start_time = time.perf_counter()
+            new_points = cmp.get_points(new_geo)
+            old_points = cmp.get_points(old_geo)
+            entry = {
+                'new_geo': str(new_geo),
+                'old_geo': str(old_geo),
+                'tweak': str(tweak),
+                'vertices': len(new_points),
+                'written': 0,
+                'read_time': time.perf_counter() - start_time,
+                'compute_time': 0.0,
+                'write_time': 0.0,
+                'error': None,
+                }
+            report.append(entry)
+            if(len(new_points) != len(old_points)):
+                entry['error'] = ("{} has {} verts but {} has {}; vertex order/count must "
+                    "match.".format(new_geo, len(new_points), old_geo, len(old_points)))
+                continue
+
+            jobs.append((entry, executor.submit(dm.compress_deltas, new_points, old_points, 
+                epsilon)))
+
+        prg.start_progbar(max_value=len(jobs), message="Baking Deltas to Tweak nodes...")
+        try:
+            for entry, job in jobs:
+                indices, offsets, entry['compute_time'] = job.result()
+
+                # Only moved vertices are written, so clear whatever an earlier bake left first.
+                start_time = time.perf_counter()
+                reset_tweak(entry['tweak'])
+                _write_runs(entry['tweak'], dm.contiguous_runs(indices, max_run=TWEAK_WRITE_RUN), 
+                    offsets)
+                entry['write_time'] = time.perf_counter() - start_time
+                entry['written'] = len(indices)
+                prg.update_progbar()
+        finally:
+            prg.end_progbar()
+
+    for entry in report:
+        if(entry['error'] is not None):
+            print("{new_geo} -> {tweak}: skipped, {error}".format(**entry))
+            continue
+        print("{new_geo} -> {tweak}: {written}/{vertices} verts, read {read_time:.3f}s, "
+            "compute {compute_time:.3f}s, write {write_time:.3f}s".format(**entry))
+
+    return report
+
+
+def transfer_deltas_to_tweak(sculpt_geo, original_geo, target_geo, tweak, 
+    correspondence='triangle', epsilon=1e-6):
+    '''
+    Bake the sculpt between sculpt_geo and original_geo onto the tweak of target_geo, which doesn't
+    need to share their topology (see component.transfer_vertex_deltas.)
+
+    usage:
+    transfer_deltas_to_tweak(sculpt_geo, original_geo, target_geo, tweak, 
+        correspondence=[string], epsilon=float)
+    epsilon - target vertices that move less than this end up at zero on the tweak; whatever the
+    tweak held before is reset first.
+
+    returns:
+    (int) Number of control point plugs written.
+    '''
+
+    deltas = cmp.transfer_vertex_deltas(sculpt_geo, original_geo, target_geo, 
+        correspondence=correspondence)
 
-    return
+    reset = reset_tweak(tweak)
+    if(reset):
+        print("Reset {} existing control points on {}.".format(reset, tweak))
 
+    return write_tweak_deltas(tweak, deltas, epsilon=epsilon)
@@ -0,0 +1,255 @@
+'''
+delta_math.py
+
+Array kernels for vertex delta work (sculpt fixes, tweak baking.)
+
+Nothing in here imports Maya, so these can be unit tested and benchmarked from a plain Python
+interpreter.  The Maya side of things (reading point buffers out of meshes) lives in component.py.
+'''
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+# Bumped whenever the layout of a sparse delta file changes.
+DELTA_FILE_VERSION = 1
+
+
+def as_points(points):
+    '''
+    Cast anything point-like into a contiguous (N, 3) float64 array.
+
+    usage:
+    as_points(points)
+    points - (N, 3) or (N, 4) array-like, or a flat list of xyz triplets as returned by
+    cmds.xform(q=True, t=True).  A fourth (homogeneous) column is dropped.
+    '''
+
+    array = np.asarray(points, dtype=np.float64)
+
+    if(array.ndim == 1):
+        if(array.size % 3 != 0):
+            raise ValueError("Flat point list has {} values, which isn't a multiple of 3.".format(
+                array.size))
+        array = array.reshape(-1, 3)
+
+    if(array.ndim != 2 or array.shape[1] not in (3, 4)):
+        raise ValueError("Expected an (N, 3) point array, got shape {}.".format(array.shape))
+
+    return np.ascontiguousarray(array[:, :3])
+
+
+def point_deltas(new_points, original_points):
+    '''
+    Subtract two equally sized point buffers in one vectorized step.
+
+    usage:
+    point_deltas(new_points, original_points)
+    new_points - (N, 3) array-like of the sculpted/changed positions.
+    original_points - (N, 3) array-like of the positions to measure from.
+
+    returns:
+    (N, 3) float64 array of new - original.
+    '''
+
+    new_points = as_points(new_points)
+    original_points = as_points(original_points)
+
+    if(new_points.shape != original_points.shape):
+        raise ValueError("Point counts don't match: {} vs {}.  Vertex order/count of both meshes "
+            "must be identical.".format(len(new_points), len(original_points)))
+
+    return new_points - original_points
+
+
+def iter_chunks(count, chunk_size):
+    '''
+    Yield (start, stop) ranges that cover range(count) in blocks of at most chunk_size.
+    '''
+
+    if(chunk_size < 1):
+        raise ValueError("chunk_size must be at least 1, got {}.".format(chunk_size))
+
+    for start in range(0, count, chunk_size):
+        yield start, min(start + chunk_size, count)
+
+
+def significant_indices(deltas, epsilon=1e-6):
+    '''
+    Find the vertices that actually moved.
+
+    usage:
+    significant_indices(deltas, epsilon=float)
+    deltas - (N, 3) array of vertex deltas.
+    epsilon - Deltas with a length at or below this are treated as unmoved.
+
+    returns:
+    Sorted int64 array of vertex indices whose delta length is greater than epsilon.
+    '''
+
+    deltas = as_points(deltas)
+    # Compare squared lengths so we skip the sqrt.
+    lengths_sq = np.einsum('ij,ij->i', deltas, deltas)
+
+    return np.flatnonzero(lengths_sq > (epsilon * epsilon)).astype(np.int64)
+
+
+def contiguous_runs(indices, max_run=None):
+    '''
+    Collapse a sorted index array into (start, stop) runs of consecutive indices.
+    Useful for turning a sparse set of vertices into as few multi-element attribute writes as
+    possible.
+
+    usage:
+    contiguous_runs(indices, max_run=int)
+    indices - sorted 1D array of ints.
+    max_run - (optional) split runs so none is longer than this.
+
+    returns:
+    List of (start, stop) tuples; stop is exclusive like a slice.
+    '''
+
+    indices = np.asarray(indices, dtype=np.int64)
+    if(indices.size == 0):
+        return []
+
+    # A break happens wherever the next index isn't exactly one more than the last.
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    starts = indices[np.concatenate(([0], breaks))]
+    stops = indices[np.concatenate((breaks - 1, [indices.size - 1]))] + 1
+
+    runs = []
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        if(max_run is None):
+            runs.append((start, stop))
+            continue
+        for sub_start in range(start, stop, max_run):
+            runs.append((sub_start, min(sub_start + max_run, stop)))
+
+    return runs
+
+
+def topology_fingerprint(vertex_count, face_counts, face_connects):
+    '''
+    Hash a mesh's topology (not its positions) so deltas can be checked against the mesh they are
+    applied to.
+
+    usage:
+    topology_fingerprint(vertex_count, face_counts, face_connects)
+    vertex_count - (int) number of vertices.
+    face_counts - vertex count of each face, as from MFnMesh.getVertices()[0].
+    face_connects - flat vertex ids of each face, as from MFnMesh.getVertices()[1].
+
+    returns:
+    (string) hex digest.
+    '''
+
+    digest = hashlib.sha1()
+    digest.update(np.int64(vertex_count).tobytes())
+    digest.update(np.ascontiguousarray(face_counts, dtype=np.int32).tobytes())
+    digest.update(np.ascontiguousarray(face_connects, dtype=np.int32).tobytes())
+
+    return digest.hexdigest()
+
+
+def sparsify(deltas, epsilon=1e-6):
+    '''
+    Drop the vertices that didn't move.
+
+    usage:
+    sparsify(deltas, epsilon=float)
+
+    returns:
+    (indices, offsets) - int32 vertex ids and the (M, 3) deltas that belong to them.
+    '''
+
+    deltas = as_points(deltas)
+    indices = significant_indices(deltas, epsilon)
+
+    return indices.astype(np.int32), deltas[indices]
+
+
+def compress_deltas(new_points, original_points, epsilon=1e-6):
+    '''
+    Diff two point buffers and keep only the vertices that moved.  Built as a standalone function
+    so it can be handed to a thread or process pool.
+
+    returns:
+    (indices, offsets, seconds) - see sparsify(); seconds is the time spent in here.
+    '''
+
+    start_time = time.perf_counter()
+    indices, offsets = sparsify(point_deltas(new_points, original_points), epsilon)
+
+    return indices, offsets, time.perf_counter() - start_time
+
+
+def densify(indices, offsets, vertex_count):
+    '''
+    Expand sparse deltas back into a full (vertex_count, 3) float64 array of deltas.
+    '''
+
+    deltas = np.zeros((vertex_count, 3), dtype=np.float64)
+    deltas[np.asarray(indices, dtype=np.int64)] = offsets
+
+    return deltas
+
+
+def save_sparse_deltas(file_path, indices, offsets, vertex_count, fingerprint, half=False, 
+    name=''):
+    '''
+    Write sparse deltas to a compressed .npz.
+
+    The file holds an int32 'indices' array, a float32 (or float16 with half=True) 'offsets' array,
+    and a JSON 'header' with the vertex count and topology fingerprint of the mesh the deltas were
+    measured on.
+
+    usage:
+    save_sparse_deltas(file_path, indices, offsets, vertex_count, fingerprint, half=[boolean], 
+        name=[string])
+    name - optional label stored in the header, like the sculpt it came from.
+    '''
+
+    indices = np.ascontiguousarray(indices, dtype=np.int32)
+    offsets = as_points(offsets).astype(np.float16 if half else np.float32)
+
+    if(len(indices) != len(offsets)):
+        raise ValueError("Got {} indices for {} offsets.".format(len(indices), len(offsets)))
+
+    header = {
+        'version': DELTA_FILE_VERSION,
+        'name': name,
+        'vertex_count': int(vertex_count),
+        'fingerprint': fingerprint,
+        'dtype': str(offsets.dtype),
+    }
+
+    with open(file_path, 'wb') as fp:
+        np.savez_compressed(
+            fp, indices=indices, offsets=offsets, header=np.array(json.dumps(header))
+            )
+
+    return file_path
+
+
+def load_sparse_deltas(file_path):
+    '''
+    Read a file written by save_sparse_deltas.
+
+    returns:
+    (dict) The header keys ('version', 'name', 'vertex_count', 'fingerprint', 'dtype') plus 
+    'indices' as int64 and 'offsets' as (M, 3) float64.
+    '''
+
+    with np.load(file_path, allow_pickle=False) as data:
+        header = json.loads(str(data['header']))
+        if(header.get('version', 0) > DELTA_FILE_VERSION):
+            raise ValueError("{} is delta file version {}, newer than this tool reads ({}).".format(
+                file_path, header.get('version'), DELTA_FILE_VERSION))
+        header['indices'] = data['indices'].astype(np.int64)
+        header['offsets'] = data['offsets'].astype(np.float64)
+
+    return header
@@ -0,0 +1,274 @@
+'''
+fbx_reader.py
+
+Reads the skeleton out of a binary FBX (7.x) without Maya: the Model hierarchy, Lcl Translation,
+Rotation and Scaling, PreRotation and RotationOrder, as the same Datablock
+fbx_utils.import_skeleton gives.
+
+The file is streamed record by record and everything that isn't a Model, its Properties70 or a
+Connection (geometry, animation curves, materials...) is skipped with a seek, so even large files
+are read quickly.
+
+A LimbNode's PreRotation becomes its jointOrient.  A Null has no jointOrient, so its PreRotation is
+baked into its rotate instead.
+
+Differences from a real import: no axis conversion (a Z-up file stays Z-up), and PostRotation,
+pivots and offsets are ignored.
+
+No Maya imports in here on purpose.
+'''
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from . import vector_math as vm
+from . import skeleton_index as ski
+from .datablock import Datablock, DATABLOCK_DTYPE
+
+FBX_MAGIC = b'Kaydara FBX Binary  \x00'
+
+# Model subtypes that become joints and transforms when Maya imports them.  Anything else (Mesh,
+# Camera, NurbsCurve...) comes in as a transform with a shape, which import_skeleton skips too.
+MODEL_NODE_TYPES = {'LimbNode': 'joint', 'Root': 'joint', 'Null': 'transform'}
+
+# Bump this whenever what read_skeleton gives back changes, so cached datablocks from the older
+# reader aren't reused (see datablock.DatablockCache.)
+READER_VERSION = 2
+CACHE_PRODUCER = 'fbx_reader-{}'.format(READER_VERSION)
+
+# FBX's EFbxRotationOrder enum, in order.
+FBX_ROTATE_ORDERS = ['xyz', 'xzy', 'yzx', 'yxz', 'zxy', 'zyx']
+
+_SCALAR_TYPES = {
+    b'Y': struct.Struct('<h'),
+    b'C': struct.Struct('<?'),
+    b'I': struct.Struct('<i'),
+    b'F': struct.Struct('<f'),
+    b'D': struct.Struct('<d'),
+    b'L': struct.Struct('<q'),
+    }
+_ARRAY_TYPES = {b'f': '<f4', b'd': '<f8', b'l': '<i8', b'i': '<i4', b'b': '?'}
+_ARRAY_HEADER = struct.Struct('<III')
+_LENGTH = struct.Struct('<I')
+
+
+class _Record:
+    __slots__ = ('name', 'end', 'property_count', 'property_end')
+
+
+def _read_header(fp):
+    if(fp.read(len(FBX_MAGIC)) != FBX_MAGIC):
+        raise ValueError("{} isn't a binary FBX (ASCII FBX isn't supported.)".format(fp.name))
+    fp.read(2)
+    version = _LENGTH.unpack(fp.read(4))[0]
+    if(version < 7000):
+        raise ValueError("{} is FBX version {}; only 7.x is supported.".format(fp.name, version))
+
+    return version
+
+
+def _records(fp, end, header):
+    '''
+    Yield each record from here up to end (or up to the null record that closes a list of children.)
+    The file is left at the start of the record's properties; the caller reads or skips from there,
+    and the next record is found by seeking to record.end.
+    '''
+
+    while(fp.tell() < end):
+        start = fp.tell()
+        values = header.unpack(fp.read(header.size))
+        if(values[0] == 0):
+            return
+        record = _Record()
+        record.end, record.property_count, property_bytes, name_length = values
+        record.name = fp.read(name_length).decode('utf-8', 'replace')
+        record.property_end = fp.tell() + property_bytes
+        if(record.end < record.property_end or record.end > end):
+            raise ValueError("Corrupt FBX record '{}' at byte {}.".format(record.name, start))
+
+        yield record
+
+        fp.seek(record.end)
+
+
+def _read_properties(fp, count):
+    properties = []
+    for _ in range(count):
+        code = fp.read(1)
+        if(code in _SCALAR_TYPES):
+            scalar = _SCALAR_TYPES[code]
+            properties.append(scalar.unpack(fp.read(scalar.size))[0])
+        elif(code in (b'S', b'R')):
+            data = fp.read(_LENGTH.unpack(fp.read(4))[0])
+            properties.append(data.decode('utf-8', 'replace') if code == b'S' else data)
+        elif(code in _ARRAY_TYPES):
+            length, encoding, byte_count = _ARRAY_HEADER.unpack(fp.read(_ARRAY_HEADER.size))
+            data = fp.read(byte_count)
+            if(encoding == 1):
+                data = zlib.decompress(data)
+            properties.append(np.frombuffer(data, dtype=_ARRAY_TYPES[code], count=length))
+        else:
+            raise ValueError("Unknown FBX property type {!r} at byte {}.".format(code,
+                fp.tell() - 1))
+
+    return properties
+
+
+def _properties70(fp, record, header):
+    '''
+    {property name: [values]} from the Properties70 under record.
+    '''
+
+    fp.seek(record.property_end)
+    found = {}
+    for child in _records(fp, record.end, header):
+        if(child.name != 'Properties70'):
+            continue
+        fp.seek(child.property_end)
+        for prop in _records(fp, child.end, header):
+            if(prop.name == 'P'):
+                values = _read_properties(fp, prop.property_count)
+                found[values[0]] = values[4:]
+
+    return found
+
+
+def _object_name(value):
+    # Binary FBX names are 'Name\x00\x01Class'.
+    return value.split('\x00\x01')[0]
+
+
+def _read_file(file_path):
+    '''
+    The raw pieces: {model id: (name, subtype, properties)}, [(child id, parent id)] and the
+    file's UnitScaleFactor.
+    '''
+
+    models = {}
+    connections = []
+    unit_scale = 1.0
+
+    with open(file_path, 'rb') as fp:
+        version = _read_header(fp)
+        header = struct.Struct('<QQQB' if version >= 7500 else '<IIIB')
+        file_end = os.fstat(fp.fileno()).st_size
+
+        needed = set(['GlobalSettings', 'Objects', 'Connections'])
+        for record in _records(fp, file_end, header):
+            if(record.name == 'GlobalSettings'):
+                unit_scale = float(_properties70(fp, record, header).get('UnitScaleFactor',
+                    [1.0])[0])
+            elif(record.name == 'Objects'):
+                fp.seek(record.property_end)
+                for node in _records(fp, record.end, header):
+                    if(node.name != 'Model'):
+                        continue
+                    node_id, name, subtype = _read_properties(fp, node.property_count)[:3]
+                    models[node_id] = (_object_name(name), subtype,
+                        _properties70(fp, node, header))
+            elif(record.name == 'Connections'):
+                fp.seek(record.property_end)
+                for link in _records(fp, record.end, header):
+                    values = _read_properties(fp, link.property_count)
+                    if(link.name == 'C' and values[0] == 'OO'):
+                        connections.append((values[1], values[2]))
+            else:
+                continue
+            needed.discard(record.name)
+            if(not needed):
+                break
+
+    return models, connections, unit_scale
+
+
+def read_skeleton(file_path, unit_scale=None):
+    '''
+    Read the joints and transforms of a binary FBX into a Datablock, without Maya.
+
+    usage:
+    read_skeleton(file_path, unit_scale=[float])
+    unit_scale - what to multiply distances by.  Defaults to the file's UnitScaleFactor, which
+    gives centimetres (Maya's default unit.)
+
+    returns:
+    Datablock (see datablock.py), rows in depth-first order so parents come before children.
+    '''
+
+    models, connections, file_unit_scale = _read_file(file_path)
+    unit_scale = file_unit_scale if unit_scale is None else unit_scale
+
+    model_ids = list(models)
+    row_of_id = dict((model_id, i) for i, model_id in enumerate(model_ids))
+    parents = np.full(len(model_ids), -1, dtype=np.int64)
+    for child, parent in connections:
+        if(child in row_of_id and parent in row_of_id):
+            parents[row_of_id[child]] = row_of_id[parent]
+
+    count = len(model_ids)
+    names = [models[model_id][0] for model_id in model_ids]
+    node_types = [MODEL_NODE_TYPES.get(models[model_id][1]) for model_id in model_ids]
+    translates = np.zeros((count, 3))
+    rotates = np.zeros((count, 3))
+    scales = np.ones((count, 3))
+    pre_rotations = np.zeros((count, 3))
+    rotate_orders = np.zeros(count, dtype=np.int64)
+    for i, model_id in enumerate(model_ids):
+        props = models[model_id][2]
+        translates[i] = props.get('Lcl Translation', (0.0, 0.0, 0.0))
+        rotates[i] = props.get('Lcl Rotation', (0.0, 0.0, 0.0))
+        scales[i] = props.get('Lcl Scaling', (1.0, 1.0, 1.0))
+        # FBX only uses pre-rotation and rotation order when RotationActive is on.
+        if(props.get('RotationActive', [0])[0]):
+            pre_rotations[i] = props.get('PreRotation', (0.0, 0.0, 0.0))
+            rotate_orders[i] = vm.ROTATE_ORDERS.index(
+                FBX_ROTATE_ORDERS[int(props.get('RotationOrder', [0])[0])])
+    translates *= unit_scale
+
+    # FBX's Lcl = T * Rpre * R * S is S @ R @ Rpre in row vectors, the same as a joint's
+    # S @ R @ jointOrient, for every model.
+    rotations = np.empty((count, 3, 3))
+    for order in np.unique(rotate_orders):
+        same = rotate_orders == order
+        rotations[same] = vm.euler_to_matrix(rotates[same], order)
+    rotations = rotations @ vm.euler_to_matrix(pre_rotations, 'xyz')
+
+    # Joints keep the pre-rotation as their jointOrient.  Transforms have nowhere to put it, so it's
+    # baked into their rotate (in their own rotate order) and translate/rotate/scale still
+    # reproduce world_space_pos.
+    is_joint = np.array([node_type == 'joint' for node_type in node_types], dtype=bool)
+    for order in np.unique(rotate_orders[~is_joint]):
+        same = ~is_joint & (rotate_orders == order)
+        rotates[same] = vm.matrix_to_euler(rotations[same], order)
+        pre_rotations[same] = 0.0
+    local_matrices = np.tile(np.eye(4), (count, 1, 1))
+    local_matrices[:, :3, :3] = scales[:, :, None] * rotations
+    local_matrices[:, 3, :3] = translates
+
+    index = ski.SkeletonIndex(names, parents, local_matrices=local_matrices)
+    full_names = [None] * count
+    for i in index.preorder:
+        parent = parents[i]
+        full_names[i] = (full_names[parent] if parent >= 0 else '') + '|' + names[i]
+
+    kept = [i for i in index.preorder if node_types[i] is not None]
+    row_of_kept = dict((i, row) for row, i in enumerate(kept))
+    records = np.zeros(len(kept), dtype=DATABLOCK_DTYPE)
+    for row, i in enumerate(kept):
+        parent = parents[i]
+        records[row]['name'] = names[i]
+        records[row]['full_name'] = full_names[i]
+        records[row]['node_type'] = node_types[i]
+        records[row]['parent'] = row_of_kept.get(parent, -1)
+        records[row]['parent_name'] = names[parent] if parent >= 0 else ''
+    kept = np.array(kept, dtype=np.int64)
+    records['translate'] = translates[kept]
+    records['rotate'] = rotates[kept]
+    records['scale'] = scales[kept]
+    records['joint_orient'] = pre_rotations[kept]
+    records['rotate_order'] = rotate_orders[kept]
+    records['world_space_pos'] = index.positions()[kept]
+
+    return Datablock(records)
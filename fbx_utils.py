@@ -1,15 +1,20 @@
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.api.OpenMaya as om
+import numpy as np
 from pprint import pprint
 import os
 import sys
+from .datablock import Datablock, DATABLOCK_DTYPE
 
-def import_skeleton(file_path):
+def import_skeleton(file_path, cache=None):
 	"""
 	imports FBX skel 
+	cache - (optional) datablock.DatablockCache.  If it already has this FBX's contents, the
+	cached datablock is returned without importing anything; otherwise the new one is added.
 	returns: 
-		- joints, transform data (list of dicts)
-		- duplicate nodes (list)
+		- Datablock (see datablock.py) of the joints and transforms.  It still unpacks into the
+		old (list of dicts, duplicate names) pair, so datablock[0] is the joint dicts.
 	"""
 
 	fbx_exts = ['.fbx', '.FBX']
@@ -25,32 +30,109 @@ def import_skeleton(file_path):
 		cmds.error("import_skeleton() failed: file given is not an FBX")
 		return
 
-	skel_nodes = cmds.file(file_path, i=True, returnNewNodes=True, ns='match_import')
-
-	if skel_nodes:
-		skel_node_data = []
-		duplicate_names = []
-		for node in skel_nodes:
-			try:
-				node_data, dups = get_joint_data(node)
-				if node_data:
-					skel_node_data.append(node_data)
-				if dups:
-					duplicate_names.append(dups)
-
-				print(node_data)
-			except:
-				continue
+	if cache is not None:
+		datablock = cache.get(file_path)
+		if datablock is not None:
+			print("Loaded {} nodes for {} from the datablock cache.".format(len(datablock),
+				base_file))
+			return datablock
 
-		cmds.delete(skel_nodes)
+	skel_nodes = cmds.file(file_path, i=True, returnNewNodes=True, ns='match_import')
 
-		return skel_node_data, duplicate_names
-	else:
+	if not skel_nodes:
 		cmds.error(
 			"import_skeleton() failed: Not working with a clean scene (or FBX file is empty)"
 			)
 		return
 
+	# Clean up the imported nodes even if harvesting fails, and let the failure through.
+	try:
+		datablock = harvest_skeleton(skel_nodes)
+	finally:
+		cmds.delete(cmds.ls(skel_nodes))
+
+	print("Harvested {} nodes from {}.".format(len(datablock), base_file))
+	if cache is not None:
+		cache.put(file_path, datablock)
+
+	return datablock
+
+
+def _plug_vector(dep_fn, attr):
+	plug = dep_fn.findPlug(attr, False)
+	return [plug.child(i).asDouble() for i in range(3)]
+
+
+def harvest_skeleton(nodes):
+	"""
+	Reads every joint and shapeless transform in nodes in one DAG walk through the OpenMaya 2 
+	function sets, instead of get_joint_data's dozen-odd cmds calls per node.
+	Values come back in UI units, the same as cmds.getAttr gives.
+
+	:param nodes: Node names (anything that isn't a joint or transform is ignored.)
+	:return: Datablock, rows in depth-first order so parents come before their children.
+	"""
+
+	dag_nodes = cmds.ls(nodes, type='transform', long=True) or []
+	wanted = set(dag_nodes)
+
+	selection = om.MSelectionList()
+	for node in dag_nodes:
+		selection.add(node)
+
+	# Only start walks from the topmost wanted nodes; the walk picks up the rest.
+	roots = []
+	for i in range(selection.length()):
+		dag_path = selection.getDagPath(i)
+		parent_path = om.MDagPath(dag_path).pop()
+		if parent_path.length() == 0 or parent_path.fullPathName() not in wanted:
+			roots.append(dag_path)
+
+	to_ui_distance = om.MDistance.internalToUI
+	to_ui_angle = om.MAngle.internalToUI
+
+	rows = []
+	row_of = {}
+	dag_it = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kTransform)
+	for root in roots:
+		dag_it.reset(root, om.MItDag.kDepthFirst, om.MFn.kTransform)
+		while not dag_it.isDone():
+			dag_path = dag_it.getPath()
+			full_name = dag_path.fullPathName()
+			dag_it.next()
+			if full_name not in wanted or full_name in row_of:
+				continue
+
+			node_type = om.MFnDagNode(dag_path).typeName
+			if node_type not in ["joint", "transform"] or (
+				node_type == "transform" and dag_path.numberOfShapesDirectlyBelow()):
+				continue
+
+			transform_fn = om.MFnTransform(dag_path)
+			parent_path = om.MDagPath(dag_path).pop()
+			has_parent = parent_path.length() > 0
+			rotation = transform_fn.rotation()
+			world_pos = dag_path.inclusiveMatrix()
+
+			row_of[full_name] = len(rows)
+			rows.append((
+				transform_fn.name(),
+				full_name,
+				node_type,
+				row_of.get(parent_path.fullPathName(), -1) if has_parent else -1,
+				om.MFnDagNode(parent_path).name() if has_parent else '',
+				[to_ui_distance(value) for value in transform_fn.translation(om.MSpace.kTransform)],
+				[to_ui_angle(value) for value in (rotation.x, rotation.y, rotation.z)],
+				transform_fn.scale(),
+				([to_ui_angle(value) for value in _plug_vector(transform_fn, 'jointOrient')]
+					if node_type == 'joint' else [0.0, 0.0, 0.0]),
+				transform_fn.findPlug('rotateOrder', False).asInt(),
+				[to_ui_distance(world_pos[12 + i]) for i in range(3)]
+				))
+
+	records = np.array(rows, dtype=DATABLOCK_DTYPE)
+	return Datablock(records)
+
 
 def get_joint_data(node):
 	'''
@@ -60,7 +142,7 @@ def get_joint_data(node):
 	:return: Data dictionary.
 	'''
 	
-	ATTRIBUTES = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz', 'sx,', 'sy', 'sz', 'jointOrient']
+	ATTRIBUTES = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz', 'sx', 'sy', 'sz', 'jointOrient']
 
 	node_type = cmds.nodeType(node)
 	shapes = cmds.listRelatives(node, children=True, shapes=True)
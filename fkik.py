@@ -46,16 +46,16 @@ def fk_to_ik(side=None, ik_bones_dict = internal_def_ik_jnts, fk_ctrls_dict = in
         fk_ctrls_dict[ctrl] = (side_token + fk_ctrls_dict[ctrl])
     print ("Side tokens added, ctrl targets are:\n {}".format(ik_bones_dict))
 
-    # Iterate through the list of key names, perform the xform matching.
+    # Gather the (bone, control) pairs and match them all in one pass; the fk controls are usually
+    # parented under each other, which match_xforms accounts for.
     targets_list = ['shoulder', 'elbow', 'wrist']
+    pairs = []
     for target_key in targets_list:
         print("Matching transforms of {} to {}...".format(
             fk_ctrls_dict[target_key], ik_bones_dict[target_key]
             ))
-        # PyNode these up:
-        target_node = pm.PyNode(fk_ctrls_dict[target_key])
-        copy_node = pm.PyNode(ik_bones_dict[target_key])
-        pm.matchTransform(target_node, copy_node, pos=True, piv=True)
+        pairs.append((ik_bones_dict[target_key], fk_ctrls_dict[target_key]))
+    m.match_xforms(pairs, rotate=False)
 
     print ("Done.")
 
@@ -98,15 +98,11 @@ def ik_to_fk(side=None, fk_bones_dict = internal_def_fk_jnts,
         ik_ctrls_dict[ctrl] = (side_token + ik_ctrls_dict[ctrl])
     print ("Side tokens added, ctrl targets are:\n {}".format(ik_ctrls_dict))
 
-    # Step one, match ik shoulder 1:1
-    shoulder_target = pm.PyNode(fk_bones_dict['shoulder'])
-    shoulder_ctrl = pm.PyNode(ik_ctrls_dict['shoulder'])
-    pm.matchTransform(shoulder_ctrl, shoulder_target, pos=True, piv=True)
-
-    # Step two, match ik wrist 1:1
-    wrist_target = pm.Pynode(fk_bones_dict['wrist'])
-    wrist_ctrl = pm.PyNode(ik_ctrls_dict['wrist'])
-    pm.matchTransform(wrist_ctrl, wrist_target, pos=True, piv=True)
+    # Steps one and two, match ik shoulder and wrist 1:1 in one pass.
+    m.match_xforms([
+        (fk_bones_dict['shoulder'], ik_ctrls_dict['shoulder']),
+        (fk_bones_dict['wrist'], ik_ctrls_dict['wrist'])
+        ], rotate=False)
 
     # Step three-- triangulate the plane on which the pole vector should go.
     normal = m.get_normal()
\ No newline at end of file
@@ -4,6 +4,7 @@
 
 import pymel.core as pm
 from . import dict_lib as dl
+from . import coord_math as m
 
 offset_string = "_Offset"
 
@@ -48,15 +49,13 @@ def create_offset(suffix=offset_string):
 
     selection = pm.ls(sl=True)
 
-    offsets_list = []
+    # Create every empty xform node first, so they can all be matched in one pass.
+    offsets_list = [pm.group(empty=True, n=(node.name() + suffix)) for node in selection]
 
-    for node in selection:
-        # Create empty xform node.
-        group = pm.group(empty=True, n=(node.name() + suffix))
-        offsets_list.append(group)
-        # Move group node to same world-space xform as the selection
-        pm.matchTransform(group, node)
+    # Move group nodes to the same world-space xform as the selection.
+    m.match_xforms(zip(selection, offsets_list), rotate=True, scale=True)
 
+    for node, group in zip(selection, offsets_list):
         # Arrange desired hierarachy (Node beneath new transform, new transform beneath old parent.)
         parent = pm.listRelatives(node, parent=True)
         pm.parent(node, group, a=True)
@@ -0,0 +1,154 @@
+'''
+mapping_graph.py
+
+A compiled, dict-based version of the generic skeleton map in constants.GENERIC_KEYS, plus any
+number of joint-name mappings onto it (like constants.SR_MAPPING), so matching code can look up
+parents, children and names in O(1) instead of scanning lists.
+
+No Maya imports in here; constants builds the shared MAPPING_GRAPH at import.
+'''
+
+
+class MappingGraph:
+    '''
+    The generic key hierarchy with its lookups precomputed.
+
+    usage:
+    graph = MappingGraph(generic_keys, mappings={'sr': SR_MAPPING})
+    generic_keys - list of (generic key, [child keys]) tuples, like constants.GENERIC_KEYS.
+    mappings - (optional) dict of mapping name to {generic key: joint name}.  '' means unmapped.
+
+    graph.keys - generic keys in the order they were given.
+    graph.order - generic keys in topological order, parents always before their children.
+    graph.issues - list of strings describing anything inconsistent that was found.
+    '''
+
+    def __init__(self, generic_keys, mappings=None):
+        self.keys = []
+        self.children = {}
+        self.parents = {}
+        self.issues = []
+
+        for key, children in generic_keys:
+            if(key in self.children):
+                self.issues.append("'{}' is listed more than once; the first is kept.".format(key))
+                continue
+            self.keys.append(key)
+            self.children[key] = []
+            for child in children:
+                if(child == key):
+                    self.issues.append("'{}' lists itself as a child.".format(key))
+                    continue
+                if(child in self.parents):
+                    self.issues.append("'{}' is a child of both '{}' and '{}'.".format(child,
+                        self.parents[child], key))
+                    continue
+                self.children[key].append(child)
+                self.parents[child] = key
+
+        for child, parent in sorted(self.parents.items()):
+            if(child not in self.children):
+                self.issues.append("'{}' is a child of '{}' but has no entry of its own.".format(
+                    child, parent))
+                self.children[child] = []
+                self.keys.append(child)
+
+        self.roots = [key for key in self.keys if key not in self.parents]
+        self.order = []
+        stack = list(reversed(self.roots))
+        while(stack):
+            key = stack.pop()
+            self.order.append(key)
+            stack.extend(reversed(self.children[key]))
+
+        if(len(self.order) != len(self.keys)):
+            reached = set(self.order)
+            self.issues.append("These keys are in a cycle and have no root: {}".format(
+                [key for key in self.keys if key not in reached]))
+
+        self._position = dict((key, i) for i, key in enumerate(self.order))
+
+        self.mappings = {}
+        self.reverse = {}
+        for name, mapping in (mappings or {}).items():
+            self.add_mapping(name, mapping)
+
+    def __contains__(self, key):
+        return key in self.children
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add_mapping(self, name, mapping):
+        '''
+        Register a {generic key: joint name} mapping and build its reverse lookup.  Unknown keys
+        and joints used by more than one key are added to issues.
+        '''
+
+        self.mappings[name] = dict(mapping)
+        reverse = {}
+        for key, joint in mapping.items():
+            if(key not in self.children):
+                self.issues.append("{} maps '{}', which isn't a generic key.".format(name, key))
+            if(not joint):
+                continue
+            if(joint in reverse):
+                self.issues.append("{} maps both '{}' and '{}' to {}.".format(name, reverse[joint],
+                    key, joint))
+                continue
+            reverse[joint] = key
+        self.reverse[name] = reverse
+
+        missing = [key for key in self.keys if key not in mapping]
+        if(missing):
+            self.issues.append("{} has no entry for {}.".format(name, missing))
+
+    def parent(self, key):
+        '''
+        The parent generic key, or None for roots.
+        '''
+
+        return self.parents.get(key)
+
+    def joint(self, mapping, key):
+        '''
+        Joint name a mapping gives a generic key, or None if it's unmapped.
+        '''
+
+        return self.mappings[mapping].get(key) or None
+
+    def key(self, mapping, joint):
+        '''
+        Generic key a joint name stands for in a mapping, or None.
+        '''
+
+        return self.reverse[mapping].get(joint)
+
+    def joints(self, mapping, keys=None):
+        '''
+        {generic key: joint name} for keys (default all, in topological order) that are mapped.
+        '''
+
+        keys = self.order if keys is None else keys
+
+        return dict((key, self.mappings[mapping][key]) for key in keys
+            if self.mappings[mapping].get(key))
+
+    def sort(self, keys):
+        '''
+        keys in topological order.
+        '''
+
+        return sorted(keys, key=lambda key: self._position.get(key, len(self._position)))
+
+    def report(self):
+        '''
+        Print every issue found, and return them.
+        '''
+
+        for issue in self.issues:
+            print("Mapping issue: {}".format(issue))
+        if(not self.issues):
+            print("No mapping issues.")
+
+        return list(self.issues)
@@ -6,17 +6,32 @@ module for altering the orientation of bones based on mapping swaps.
 
 import pymel.core as pm
 import pymel.core.datatypes as dt
+import maya.cmds as cmds
+import numpy as np
 
+from . import coord_math as cm
+from . import file_ops as fo
+from . import vector_math as vm
 
-def smart_copy_orient(subject=None, target=None, s_child=None, t_child=None, reparent=True):
+
+def smart_copy_orient(subject=None, target=None, s_child=None, t_child=None, reparent=True, 
+    analytic=False):
     '''
     'smartly' copies the orientation from one joint to another, preserving the actual orientation by
     degrees, but fully re-aligning the axial orientation.
 
+    This is batch_copy_orient for a single pair, so it gives the same result as
+    build_reoriented_skeleton and copy_orient_from_example do on the same joints: the signed down
+    axes and the closest side axes are matched (see solve_copy_orients), and each new source axis
+    takes the target axis it lines up with.
+
     Usage:
-    smart_copy_orient(subject=(PyNode), target=(PyNode))
-    subject - the joint upon which to paste the orientation
-    target - the joint from which to copy the orientation from    
+    smart_copy_orient(subject=(PyNode), target=(PyNode), s_child=[joint], t_child=[joint])
+    subject - the joint to copy the orientation from
+    target - the joint upon which to paste the orientation
+    s_child/t_child - the joints each one points down to.  Defaults to their only child.
+    reparent/analytic - no longer used; the target's children always keep their world matrices
+    without being reparented (see set_world_rotations.)
     '''
     ui_mode = False
     if(subject == None or target == None):
@@ -28,48 +43,324 @@ def smart_copy_orient(subject=None, target=None, s_child=None, t_child=None, rep
             subject = selection[0]
             target = selection[1]
 
-    # The angle-discovering and comparing operations that make this possible:
-    # Step one, find the 'down' vector-- the vector that points to the child joint and record the 
-    # "swap"
-    s_down_vec = find_down_axis(subject, child_name=s_child)
-    t_down_vec = find_down_axis(target, child_name=t_child)
-
-    if(s_down_vec == None or t_down_vec == None):
-        if(s_child==None or t_child==None):
-            pm.error("There's no child joint to derive a down vector from on one or both {} and {}"
+    # Step one, find the child each joint points down to.
+    children = []
+    for joint, child in [(subject, s_child), (target, t_child)]:
+        if(child is None):
+            child_list = _oriented_children([joint], set())
+            if(len(child_list) > 1):
+                pm.error("smart_copy_orient() won't work on multi-child joints.  {} has {} child "
+                    "joints.".format(joint, len(child_list)))
+            child = child_list[0] if child_list else None
+        children.append(child)
+
+    if(None in children):
+        pm.error("There's no child joint to derive a down vector from on one or both {} and {}"
             .format(subject, target))
 
-    # Get the child to peform the deparent:
-    if(reparent):
-        if(t_child is None):
-            print("Finding child...")
-            child_joint =pm.listRelatives(target, c=True)[0]
-        else:
-            child_joint = pm.PyNode(t_child)
-        print("Deparenting {}".format(child_joint))
-        pm.parent(child_joint, w=True, a=True)
+    # Step two, the down/side swap and the write, shared with the whole-skeleton version.
+    batch_copy_orient([(subject, target, children[0], children[1])])
 
-    down_swap = (s_down_vec[0], t_down_vec[0])
+    # Finish by selecting target.
+    if(ui_mode):
+        pm.select(target, r=True)
 
-    # Step two, find the closest matching angles between the source and target, while excluding the 
-    # down angles:
-    side_swap = closest_axis(subject, target, s_exclude_axis=down_swap[0], 
-        t_exclude_axis=down_swap[1])[:2]
+    return
 
-    # Finally, knowing the swappable match facing down/aim, and the swappable match that is used as
-    # an "up vector", perform the swap by deconstructing and re-constructing the matrix:
-    swap_axis(target, aim_swap=down_swap, up_swap=side_swap, orient_joint=True)
 
-    if(reparent):
-        pm.parent(child_joint, target, a=True)
+def solve_copy_orients(source_axes, target_axes, source_down, target_down):
+    '''
+    The math behind smart_copy_orient, for many joints at once and without Maya.
 
-    # Finish by selecting target.
-    if(ui_mode):
-        pm.select(target, r=True)
+    For each pair, find the signed axis of each joint that points down the bone, then the closest
+    pair of remaining axes, and rebuild the target's axes so they're labelled like the source's
+    while still pointing where the target's did.
+
+    usage:
+    solve_copy_orients(source_axes, target_axes, source_down, target_down)
+    source_axes/target_axes - (N, 3, 3) unit axis rows of the world matrices.
+    source_down/target_down - (N, 3) vectors from each joint to its child.
+
+    returns:
+    (rotations, down_swaps, side_swaps) - (N, 3, 3) new unit axis rows for the targets, and the
+    (source axis, target axis) string pairs that were used, like smart_copy_orient.
+    '''
+
+    source_axes = np.asarray(source_axes, dtype=np.float64).reshape(-1, 3, 3)
+    target_axes = np.asarray(target_axes, dtype=np.float64).reshape(-1, 3, 3)
+
+    # Axes are indexed like vm.SIGNED_AXES: 0-2 are x,y,z and 3-5 are -x,-y,-z.
+    source_down_axis = vm.down_axes(source_axes, source_down, signed=True)
+    target_down_axis = vm.down_axes(target_axes, target_down, signed=True)
+
+    # Closest remaining pair, with the down axes ruled out on both sides.
+    source_side_axis, target_side_axis = vm.closest_axes(source_axes, target_axes, 
+        source_exclude=source_down_axis, target_exclude=target_down_axis % 3, exclude_opposite=True)
+
+    # Source axis s lines up with target axis t, so the new s is the old t.
+    permutations = vm.axis_permutations(source_down_axis, target_down_axis, source_side_axis, 
+        target_side_axis)
+    rotations = vm.AXIS_PERMUTATIONS[permutations] @ target_axes
+
+    down_swaps = [(vm.SIGNED_AXES[s], vm.SIGNED_AXES[t]) 
+        for s, t in zip(source_down_axis, target_down_axis)]
+    side_swaps = [(vm.SIGNED_AXES[s], vm.AXES[t]) 
+        for s, t in zip(source_side_axis, target_side_axis)]
+
+    return rotations, down_swaps, side_swaps
+
+
+def _oriented_children(nodes, skip):
+    '''
+    Full paths of the transform and joint children of nodes, minus anything in skip.
+    '''
+
+    children = []
+    for node in nodes:
+        for child in cmds.listRelatives(str(node), children=True, fullPath=True) or []:
+            if(cmds.nodeType(child) in ['transform', 'joint'] and child not in skip):
+                children.append(child)
+
+    return children
+
+
+def set_world_rotations(nodes, rotations, orient_joint=True):
+    '''
+    Give many nodes new world orientations in one pass, keeping their world position and scale, and
+    keeping the world matrix of every child that isn't in nodes itself.  Nothing is reparented.
+
+    usage:
+    set_world_rotations(nodes, rotations, orient_joint=[boolean])
+    rotations - (N, 3, 3) unit axis rows, one per node.
+    orient_joint - joints in nodes get their rotation in jointOrient with rotate zeroed, like
+    swap_axis(orient_joint=True).  Otherwise they're rotated.
+    '''
+
+    nodes = [str(node) for node in nodes]
+    node_paths = cm.get_dag_paths(nodes)
+    full_paths = [dag_path.fullPathName() for dag_path in node_paths]
+    children = _oriented_children(full_paths, set(full_paths))
+
+    dag_paths = node_paths + cm.get_dag_paths(children)
+    old_world = cm.get_world_matrices(None, dag_paths=dag_paths)
+    new_world = old_world.copy()
+
+    _, scales, _ = vm.decompose_matrices(old_world[:len(nodes)])
+    new_world[:len(nodes), :3, :3] = scales[:, :, None] * np.asarray(rotations).reshape(-1, 3, 3)
+
+    local_matrices = cm.solve_local_matrices(dag_paths, old_world, new_world)
+
+    # Joints among the children take the change in their jointOrient and keep their rotate, the
+    # same as reparenting them would.  Everything else is rotated.
+    for names, locals_, subject in [(nodes, local_matrices[:len(nodes)], True), 
+        (children, local_matrices[len(nodes):], False)]:
+        oriented = np.array([cmds.nodeType(name) == 'joint' and (orient_joint or not subject) 
+            for name in names], dtype=bool)
+        if(oriented.any()):
+            cm.set_joint_orients([name for name, o in zip(names, oriented) if o], 
+                locals_[oriented], keep_rotate=not subject)
+        if((~oriented).any()):
+            cm.set_local_matrices([name for name, o in zip(names, oriented) if not o], 
+                locals_[~oriented], scale=False)
 
     return
 
 
+class OrientationPlan:
+    '''
+    A dry run of a reorientation job: world orientations for a set of joints, worked out without
+    touching the scene.  Review the per-joint deltas, save it for later, and apply() it in one write
+    that undoes as a single step.
+
+    usage:
+    plan = OrientationPlan()
+    batch_copy_orient(mapping, plan=plan) # or aim_chain(..., plan=plan), or plan.add(...)
+    plan.report()
+    plan.save('C:/plans/reorient.json')
+    OrientationPlan.load('C:/plans/reorient.json').apply()
+    '''
+
+    def __init__(self, orient_joint=True):
+        '''
+        orient_joint - see set_world_rotations.
+        '''
+
+        self.orient_joint = orient_joint
+        self.joints = []
+        # (N, 3, 3) planned world axis rows, and what each joint had when it was planned.
+        self.rotations = np.zeros((0, 3, 3))
+        self.original = np.zeros((0, 3, 3))
+
+    def __len__(self):
+        return len(self.joints)
+
+    def add(self, joints, rotations):
+        '''
+        Plan world rotations for joints.  A joint that's already in the plan gets the new rotation
+        but keeps its original.
+        '''
+
+        joints = [str(joint) for joint in joints]
+        rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+        if(len(joints) != len(rotations)):
+            pm.error("Got {} rotations for {} joints.".format(len(rotations), len(joints)))
+        if(not joints):
+            return
+
+        original, _, _ = vm.decompose_matrices(cm.get_world_matrices(joints))
+
+        index = dict((joint, i) for i, joint in enumerate(self.joints))
+        new = np.array([joint not in index for joint in joints], dtype=bool)
+        for joint, rotation in zip(joints, rotations):
+            if(joint in index):
+                self.rotations[index[joint]] = rotation
+
+        self.joints += [joint for joint, is_new in zip(joints, new) if is_new]
+        self.rotations = np.concatenate([self.rotations, rotations[new]])
+        self.original = np.concatenate([self.original, original[new]])
+
+    def deltas(self):
+        '''
+        How far each joint will turn, in degrees, as a (N,) numpy array.
+        '''
+
+        relative = np.swapaxes(self.original, 1, 2) @ self.rotations
+        cosines = (np.trace(relative, axis1=1, axis2=2) - 1.0) * 0.5
+
+        return np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+    def report(self, threshold=0.0):
+        '''
+        Print every joint turning more than threshold degrees, biggest first.
+
+        returns:
+        List of (joint, degrees) tuples.
+        '''
+
+        deltas = self.deltas()
+        order = np.argsort(-deltas, kind='stable')
+        lines = [(self.joints[i], float(deltas[i])) for i in order if deltas[i] > threshold]
+        for joint, delta in lines:
+            print("{}: {:.3f} degrees".format(joint, delta))
+        print("{} of {} joints in plan turn more than {} degrees.".format(len(lines), len(self),
+            threshold))
+
+        return lines
+
+    def save(self, file_path):
+        '''
+        Write the plan to a JSON file (see file_ops.json_out.)
+        '''
+
+        data = {
+            'orient_joint': self.orient_joint,
+            'joints': self.joints,
+            'rotations': self.rotations.tolist(),
+            'original': self.original.tolist()
+            }
+
+        return fo.json_out(data, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        '''
+        Read a plan written by save().
+        '''
+
+        data = fo.json_in(file_path)
+        if(not data):
+            pm.error("Couldn't read an orientation plan from {}.".format(file_path))
+
+        plan = cls(orient_joint=data['orient_joint'])
+        plan.joints = list(data['joints'])
+        plan.rotations = np.asarray(data['rotations'], dtype=np.float64).reshape(-1, 3, 3)
+        plan.original = np.asarray(data['original'], dtype=np.float64).reshape(-1, 3, 3)
+
+        return plan
+
+    def apply(self):
+        '''
+        Write the whole plan to the scene in one pass, as one undo step and with the viewport
+        suspended until it's done.
+        '''
+
+        missing = [joint for joint in self.joints if not cmds.objExists(joint)]
+        if(missing):
+            pm.error("Can't apply plan, these joints aren't in the scene: {}".format(missing))
+        if(not self.joints):
+            return
+
+        cmds.undoInfo(openChunk=True, chunkName='OrientationPlan')
+        cmds.refresh(suspend=True)
+        try:
+            set_world_rotations(self.joints, self.rotations, orient_joint=self.orient_joint)
+        finally:
+            cmds.refresh(suspend=False)
+            cmds.undoInfo(closeChunk=True)
+
+        print("Applied orientation plan to {} joints.".format(len(self)))
+
+
+def batch_copy_orient(mapping, plan=None):
+    '''
+    Whole-skeleton version of smart_copy_orient: every world matrix is read once, every swap is
+    solved together in numpy (see solve_copy_orients), and the results are written in one pass with
+    no reparenting.
+
+    usage:
+    batch_copy_orient([(source_joint, target_joint, source_child, target_child), ...])
+    source_joint - the joint to copy the orientation from (the 'subject' of smart_copy_orient.)
+    target_joint - the joint to paste it onto.
+    source_child/target_child - the joints each one points down to.  If either is None, the source's
+    world orientation is copied straight over like dumb_copy_orient (the target keeps its position.)
+    plan - (optional) an OrientationPlan to add the results to, instead of writing them.  The
+    plan's own orient_joint is used when it's applied.
+
+    returns:
+    (dict) {'smart': [target names], 'dumb': [target names]}
+    '''
+
+    mapping = [tuple(entry) for entry in mapping]
+    if(not mapping):
+        return {'smart': [], 'dumb': []}
+
+    sources = [entry[0] for entry in mapping]
+    targets = [entry[1] for entry in mapping]
+    smart = np.array([entry[2] is not None and entry[3] is not None for entry in mapping], 
+        dtype=bool)
+
+    source_world = cm.get_world_matrices(sources)
+    target_world = cm.get_world_matrices(targets)
+    source_axes, _, _ = vm.decompose_matrices(source_world)
+    target_axes, _, _ = vm.decompose_matrices(target_world)
+
+    # Dumb copies take the source's axes as they are.
+    rotations = source_axes.copy()
+
+    if(smart.any()):
+        smart_entries = [entry for entry, s in zip(mapping, smart) if s]
+        source_children = cm.get_world_matrices([entry[2] for entry in smart_entries])
+        target_children = cm.get_world_matrices([entry[3] for entry in smart_entries])
+
+        rotations[smart], down_swaps, side_swaps = solve_copy_orients(
+            source_axes[smart], target_axes[smart],
+            source_children[:, 3, :3] - source_world[smart, 3, :3],
+            target_children[:, 3, :3] - target_world[smart, 3, :3]
+            )
+        for entry, down_swap, side_swap in zip(smart_entries, down_swaps, side_swaps):
+            print("{}: down {}, side {}".format(entry[1], down_swap, side_swap))
+
+    if(plan is not None):
+        plan.add(targets, vm.orthonormalize(rotations))
+    else:
+        set_world_rotations(targets, vm.orthonormalize(rotations))
+
+    return {
+        'smart': [str(target) for target, s in zip(targets, smart) if s],
+        'dumb': [str(target) for target, s in zip(targets, smart) if not s]
+        }
+
+
 def dumb_copy_orient(subject=None, target=None):
     '''
     Given a target pynode and a subject pynode (Or selections), match the orientation of the target 
@@ -88,10 +379,14 @@ def dumb_copy_orient(subject=None, target=None):
     target.setMatrix(copied_matrix, worldSpace=True)
 
 
-def swap_axis(subject, aim_swap, up_swap, orient_joint=False, parent_safe=True):
+def swap_axis(subject, aim_swap, up_swap, orient_joint=False, parent_safe=True, analytic=False):
     '''
     Given the target axis that represents the new way it should be oriented, shuffle the contents 
     of the matrix such that the alignment's axis can be switched
+
+    analytic - instead of reparenting the children to keep them in place, solve their new local
+    matrices (or jointOrients) from the old and new matrix and write them straight in (see 
+    set_world_rotations.)  Same result, no DAG edits.  Overrides parent_safe.
     '''
 
     # Swap relationships come in as tuples-- the second index being the axis to be replaced, and the 
@@ -193,7 +488,7 @@ def swap_axis(subject, aim_swap, up_swap, orient_joint=False, parent_safe=True):
     elif(zfor == 'y'):
         t_z_vec = s_y_vec
     elif(zfor == 'z'):
-        t_z_vec = s_y_vec
+        t_z_vec = s_z_vec
     elif(zfor == '-x'):
         t_z_vec = -s_x_vec
     elif(zfor == '-y'):
@@ -216,7 +511,7 @@ def swap_axis(subject, aim_swap, up_swap, orient_joint=False, parent_safe=True):
         print("Y vector for target in this case will be cross product.")
         t_x_vec.normalize()
         t_z_vec.normalize()
-        t_y_vec = t_x_vec.cross(t_z_vec)
+        t_y_vec = t_z_vec.cross(t_x_vec)
         t_y_vec.normalize()
 
     elif(t_z_vec == None):
@@ -241,6 +536,10 @@ def swap_axis(subject, aim_swap, up_swap, orient_joint=False, parent_safe=True):
     # Reconstruct the translate
     fresh_matrix = dt.Matrix(m0, m1, m2, m3)
 
+    if(analytic):
+        set_world_rotations([subject], [m0[:3], m1[:3], m2[:3]], orient_joint=orient_joint)
+        return
+
     # Since Maya's own jointOrient command is pretty weak, we will temporarily de-parent things.
     if(parent_safe):
         child_list = (
@@ -281,59 +580,97 @@ def find_down_axis(joint_node, child_name=None):
     Given a joint node, find the vector between itself and it's child, and compare all axis in the 
     matrix to that.
 
-    vector - If True, return value is a dt.Vector of the "down skeleton" axis.
+    returns:
+    (tuple) (axis string, normalized dt.Vector pointing down the bone), or None with no child.
+    See find_down_axes for many joints at once.
     '''
 
-    if(child_name == None):
-        child_list = (
-            [child for child in pm.listRelatives(joint_node, c=True) 
-            if(child.type() in ['transform', 'joint'])]
-            )
+    return find_down_axes([joint_node], child_names=[child_name])[0]
+
+
+def find_down_axes(joint_nodes, child_names=None, signed=False, index=None):
+    '''
+    Batch version of find_down_axis.  Every joint and child matrix is read in one pass and all the
+    axes are picked at once (see vector_math.down_axes.)
+
+    usage:
+    find_down_axes(joint_nodes, child_names=[list], signed=[boolean], index=[SkeletonIndex])
+    child_names - (optional) child for each joint; None entries (or no list) use the only child.
+    signed - pick from -x, -y, -z too.
+    index - (optional) a skeleton.index_skeleton() covering the joints, to take children and
+    matrices from instead of the scene.
+
+    returns:
+    List of (axis string, dt.Vector) tuples, with None for joints that have no child.
+    '''
+
+    joint_nodes = list(joint_nodes)
+    if(child_names is None):
+        child_names = [None] * len(joint_nodes)
+
+    children = []
+    for joint_node, child_name in zip(joint_nodes, child_names):
+        if(child_name is not None):
+            children.append(str(child_name))
+            continue
+
+        if(index is not None):
+            child_list = [index.paths[child] for child in index.children(index.index(joint_node))]
+        else:
+            child_list = _oriented_children([joint_node], set())
 
         # This process can't ever pick a "favored" child joint if there's more than one-- I've 
         # chosen to complete crash this process
         if(len(child_list) > 1):
             pm.error("find_down_axis() won't work on multi-child joints.  {} has {} child joints."
-            .format(joint_node.name(), len(child_list)))
+            .format(joint_node, len(child_list)))
             return
+        children.append(child_list[0] if child_list else None)
 
-        elif(len(child_list) < 1):
-            return None
-        else:
-            child = child_list[0]
-    else:
-        child = pm.PyNode(child_name)
-
-    # Find the vector between the joint and the child.
-    joint_ws = dt.Vector(pm.xform(joint_node, q=True, ws=True, t=True))
-    child_ws = dt.Vector(pm.xform(child, q=True, ws=True, t=True))
-    down_vec = child_ws - joint_ws
-    down_vec.normalize()
-
-    # Now that we have the vector pointing to the next joint, which find which part of the matrix
-    # has the closest angle to it
-    joint_matrix = joint_node.getMatrix(worldSpace=True)
-    # Take apart the matrix into vectors for each axis
-    x_axis = dt.Vector(joint_matrix[0][:3])
-    y_axis = dt.Vector(joint_matrix[1][:3])
-    z_axis = dt.Vector(joint_matrix[2][:3])
-
-    # Collect a list of angles betwee existing axis and our "down vector".  The smallest angle will 
-    # be from the intended "down axis"
-    angle_list = []
-    for axis_vec in [x_axis, y_axis, z_axis]:
-        if(down_vec.normal() != axis_vec.normal()):
-            angle_list.append(down_vec.angle(axis_vec))
-        else:
-            angle_list.append(0.0)
-    # Get an int 0,1,2 for x,y,z
-    smallest_angle = min(angle_list)
-    axis_index = angle_list.index(smallest_angle)
+    has_child = [child is not None for child in children]
+    results = [None] * len(joint_nodes)
+    if(not any(has_child)):
+        return results
+
+    def world_matrices(nodes):
+        if(index is not None):
+            return index.world_matrices[index.indices(nodes)]
+        return cm.get_world_matrices(nodes)
+
+    joint_matrices = world_matrices([joint for joint, use in zip(joint_nodes, has_child) if use])
+    child_matrices = world_matrices([child for child in children if child is not None])
+
+    down_vecs = vm.normalize(child_matrices[:, 3, :3] - joint_matrices[:, 3, :3])
+    axes = vm.down_axes(joint_matrices, down_vecs, signed=signed)
+
+    hits = iter(zip(axes, down_vecs))
+    for i, use in enumerate(has_child):
+        if(use):
+            axis, down_vec = next(hits)
+            results[i] = (vm.SIGNED_AXES[axis], dt.Vector(down_vec.tolist()))
+
+    return results
+
+
+def _axis_flag(axis, count, flag_name):
+    '''
+    Turn exclusion flags (None, one axis string, or a list of them) into SIGNED_AXES indices.
+    '''
 
-    # Prep readable strings instead of the sint:
-    axis_strings = ['x', 'y', 'z']
+    if(axis is None or isinstance(axis, str)):
+        axis = [axis] * count
 
-    return (axis_strings[axis_index], down_vec)
+    indices = []
+    for entry in axis:
+        if(entry is None):
+            indices.append(-1)
+        elif(entry in vm.SIGNED_AXES):
+            indices.append(vm.SIGNED_AXES.index(entry))
+        else:
+            pm.error("Bad string for '{}' flag.  Must be ['x','y','z','-x','-y','-z']".format(
+                flag_name))
+
+    return np.array(indices, dtype=np.int64)
 
 
 def closest_axis(source_joint, target_joint, s_exclude_axis=None, t_exclude_axis=None):
@@ -346,62 +683,47 @@ def closest_axis(source_joint, target_joint, s_exclude_axis=None, t_exclude_axis
     - target_joint: (pynode) of the joint we are snapping to.
     - source_joint: pynode of the joint we are aligning by.
     - excluse_axis: Char value of the previously determined "down axis" that doesn't need checking.
+    Only that exact signed axis is skipped; its opposite can still match.
 
     returns:
     (tuple) (closest matching source axis, closest matching target axis, closest target's vector)
+    See closest_axes for many joints at once.
     '''
 
-    target_matrix = target_joint.getMatrix(worldSpace=True)
-    source_matrix = source_joint.getMatrix(worldSpace=True)
+    return closest_axes([source_joint], [target_joint], s_exclude_axes=s_exclude_axis, 
+        t_exclude_axes=t_exclude_axis)[0]
 
-    target_angles = []
 
-    source_x_axis = dt.Vector(source_matrix[0][:3])
-    source_y_axis = dt.Vector(source_matrix[1][:3])
-    source_z_axis = dt.Vector(source_matrix[2][:3])
+def closest_axes(source_joints, target_joints, s_exclude_axes=None, t_exclude_axes=None):
+    '''
+    Batch version of closest_axis: reads all the matrices in one pass and compares every pair with 
+    one (N, 6, 3) matrix of dot products (see vector_math.closest_axes.)
 
-    target_x_axis = dt.Vector(target_matrix[0][:3])
-    target_y_axis = dt.Vector(target_matrix[1][:3])
-    target_z_axis = dt.Vector(target_matrix[2][:3])
+    usage:
+    closest_axes(source_joints, target_joints, s_exclude_axes=[string or list], 
+        t_exclude_axes=[string or list])
+    s_exclude_axes/t_exclude_axes - one axis string for all pairs, or one (or None) per pair.
 
-    source_vectors = [
-        source_x_axis, source_y_axis, source_z_axis, -source_x_axis, -source_y_axis, -source_z_axis
-    ]
-    target_vectors = [
-        target_x_axis, target_y_axis, target_z_axis]
+    returns:
+    List of (source axis, target axis, source axis dt.Vector) tuples, like closest_axis.
+    '''
 
-    axis = ['x', 'y', 'z', '-x', '-y', '-z']
+    source_joints = list(source_joints)
+    count = len(source_joints)
+    source_exclude = _axis_flag(s_exclude_axes, count, 's_exclude_axis')
+    target_exclude = _axis_flag(t_exclude_axes, count, 't_exclude_axis')
+    target_exclude[target_exclude >= 0] %= 3
 
-    # Get the "s_exclude_axis" flag's demands sorted-- a 'None' gets skipped later.
-    if(s_exclude_axis != None):
-        if(s_exclude_axis in axis):
-            source_vectors[axis.index(s_exclude_axis)] = None
-        else:
-            pm.error("Bad string for 's_exlude_axis' flag.  Must be ['x','y','z','-x','-y','-z']")
+    source_axes, _, _ = vm.decompose_matrices(cm.get_world_matrices(source_joints))
+    target_axes, _, _ = vm.decompose_matrices(cm.get_world_matrices(target_joints))
 
-    if(t_exclude_axis != None):
-        if(t_exclude_axis in axis):
-            target_vectors[axis.index(t_exclude_axis)] = None
-        else:
-            pm.error("Bad string for 's_exlude_axis' flag.  Must be ['x','y','z']")
+    source_match, target_match = vm.closest_axes(source_axes, target_axes, 
+        source_exclude=source_exclude, target_exclude=target_exclude)
 
+    source_signed = np.concatenate([source_axes, -source_axes], axis=1)
 
-    smallest_angle = 360.1
-    for s_vector in source_vectors:
-        # Check if this axis has been excluded and continue in that case
-        if s_vector is None:
-            continue
-        for t_vector in target_vectors:
-            if(t_vector == None):
-                continue
-            if(s_vector.angle(t_vector) < smallest_angle):
-                smallest_angle = s_vector.angle(t_vector)
-                t_match_axis = axis[target_vectors.index(t_vector)]
-                s_match_axis = axis[source_vectors.index(s_vector)]
-                t_match_vec = s_vector
-
-    return (s_match_axis, t_match_axis, t_match_vec)
-
+    return [(vm.SIGNED_AXES[s], vm.AXES[t], dt.Vector(source_signed[i, s].tolist())) 
+        for i, (s, t) in enumerate(zip(source_match, target_match))]
 
 
 def aim_at(subject, target, up_vector=(0.0, 0.0, 1.0), aim_axis=0, up_axis=2):
@@ -411,88 +733,93 @@ def aim_at(subject, target, up_vector=(0.0, 0.0, 1.0), aim_axis=0, up_axis=2):
     
     usage:
     aim_at(PyNode, PyNode, up_vector=(float, float, float), aim_axis=int, up_axis=int)
+    See aim_chain to aim a whole chain at once.
     '''
 
-    fix_determinant = False # A flag to fix negative determinants
+    for flag, axis in [('aim_axis', aim_axis), ('up_axis', up_axis)]:
+        if(axis not in (0, 1, 2)):
+            pm.error("Bad axis int given for {}: {}; should be 0,1,2 for x,y,z.".format(flag, axis))
 
     subject_position = subject.getTranslation(space='world')
     target_position = target.getTranslation(space='world')
 
-    aim_vector = target_position - subject_position
-    aim_vector.normalize()
-
-    up_vector_scoped = dt.Vector(up_vector) # named to separate it from the arg.
-    up_vector_scoped.normalize()
-
-    last_vector = up_vector_scoped.cross(aim_vector)
-    last_vector.normalize()
-
-    # Some combination of chosen axis will create a negative determinent.  This gets reconciled by
-    # the scale becoming negative.
-    flip_combos = [(0,1), (1,2), (2,0)]
-    if((aim_axis, up_axis) in flip_combos):
-        fix_determinant = True # With this flag, we know to re-calc the last_axis.
-
-    up_vector_scoped = aim_vector.cross(last_vector)
-    up_vector_scoped.normalize()
-
-    # Now the three vectors are ready, their position inside the matrix has to get chosen.
-    axes = ['x', 'y', 'z']
-
-    if(fix_determinant):
-        # By re-discovering the cross product at this point, we "reverse" it (not negate it!) which
-        # will prevent a negative scale in certain arrangements of the matrix (half of the total 
-        # possible configurations have this problem.)
-        last_vector = aim_vector.cross(up_vector_scoped)
-        last_vector.normalize()
-        
-    if(aim_axis == 0):
-        x_row = list(aim_vector)
-        axes.remove('x')
-    elif(aim_axis == 1):
-        y_row = list(aim_vector)
-        axes.remove('y')
-    elif(aim_axis == 2):
-        z_row = list(aim_vector)
-        axes.remove('z')
-    else:
-        pm.error("Bad axis int given for aim_axis: {}; should be 0,1,2 for x,y,z.".format(aim_axis))
-
-    if(up_axis == 0):
-        x_row = list(up_vector_scoped)
-        axes.remove('x')
-    elif(up_axis == 1):
-        y_row = list(up_vector_scoped)
-        axes.remove('y')
-    elif(up_axis == 2):
-        z_row = list(up_vector_scoped)
-        axes.remove('z')
-    else:
-        pm.error("Bad axis int given for up_axis: {}; should be 0,1,2 for x,y,z.".format(up_axis))
-
-    if(axes[0] == 'x'):
-        x_row = list(last_vector)
-    elif(axes[0] == 'y'):
-        y_row = list(last_vector)
-    elif(axes[0] == 'z'):
-        z_row = list(last_vector)
-    else:
-        pm.error("Failed to determine last vector.  This is a bug.")
-
-    # Append fourth values to the matrix' right side.
-    for row in [x_row, y_row, z_row]:
-        row.append(0.0)
+    # Some combination of chosen axis would create a negative determinent; aim_matrices keeps them
+    # all right handed.
+    rotation = vm.aim_matrices(list(target_position - subject_position), up_vector, 
+        aim_axis=aim_axis, up_axis=up_axis)[0]
 
-    # Create the bottom row of the matrix using the transform of the subject, plus a final 1.0
-    trans_row = list(subject_position)
-    trans_row.append(1.0)
+    # Rows of the rotation, plus the subject's position and a final 1.0
+    rows = [list(row) + [0.0] for row in rotation.tolist()]
+    rows.append(list(subject_position) + [1.0])
 
-    new_matrix = dt.Matrix(x_row, y_row, z_row, trans_row)
+    new_matrix = dt.Matrix(*rows)
     subject.setMatrix(new_matrix, worldSpace=True)
 
     return
 
 
+def aim_chain(joints, up_vector=(0.0, 0.0, 1.0), up_object=None, aim_axis=0, up_axis=2, 
+    inherit_end=True, orient_joint=True, plan=None):
+    '''
+    Aims every joint of a chain down the next one in one vectorized pass (see 
+    vector_math.aim_matrices), and writes the whole chain at once without reparenting.  Positions
+    don't change, and anything hanging off the chain that isn't in it keeps its world matrix.
+
+    usage:
+    aim_chain(joints, up_vector=(float, float, float), up_object=[node], aim_axis=int, up_axis=int,
+        inherit_end=[boolean], orient_joint=[boolean], plan=[OrientationPlan])
+    joints - the chain, root first.  Each joint aims at the one after it.
+    up_vector - world up vector used by every joint.
+    up_object - (optional) node whose position each joint twists toward instead of up_vector.
+    inherit_end - the last joint has nothing to aim at, so give it its parent's new orientation.
+    Otherwise it's left alone.
+    orient_joint - put the rotation in jointOrient and zero rotate (see set_world_rotations.)
+    plan - (optional) an OrientationPlan to add the results to, instead of writing them.  The
+    plan's own orient_joint is used when it's applied.
+
+    returns:
+    (N, 3, 3) numpy array of the world axis rows given to the chain.
+    '''
+
+    joints = [str(joint) for joint in joints]
+    if(len(joints) < 2):
+        pm.error("aim_chain() needs at least two joints.")
+    for flag, axis in [('aim_axis', aim_axis), ('up_axis', up_axis)]:
+        if(axis not in (0, 1, 2)):
+            pm.error("Bad axis int given for {}: {}; should be 0,1,2 for x,y,z.".format(flag, axis))
+    if(aim_axis == up_axis):
+        pm.error("Aimed vector and up vector can't be the same thing!")
+
+    positions = cm.get_world_matrices(joints)[:, 3, :3]
+
+    if(up_object is not None):
+        up_vectors = cm.get_world_matrices([up_object])[0, 3, :3] - positions[:-1]
+    else:
+        up_vectors = vm.as_vectors(up_vector)
+
+    aim_vectors = positions[1:] - positions[:-1]
+    rotations = vm.aim_matrices(aim_vectors, up_vectors, aim_axis=aim_axis, up_axis=up_axis)
+
+    # Zero-length bones or an up vector parallel to the bone leave nothing to build from.
+    degenerate = np.abs(np.linalg.det(rotations)) < 0.5
+    if(degenerate.any()):
+        pm.warning("Couldn't aim {}; their bone is zero length or parallel to the up vector."
+            .format([joint for joint, bad in zip(joints, degenerate) if bad]))
+
+    nodes = [joint for joint, bad in zip(joints[:-1], degenerate) if not bad]
+    rotations = rotations[~degenerate]
+    if(inherit_end and not degenerate[-1]):
+        nodes.append(joints[-1])
+        rotations = np.concatenate([rotations, rotations[-1:]])
+
+    if(plan is not None):
+        plan.add(nodes, rotations)
+    elif(nodes):
+        set_world_rotations(nodes, rotations, orient_joint=orient_joint)
+
+    return rotations
+
+
 def swap_rot_for_jo(joint_node):
     '''
     Swaps rotation of transform for the jointOrient values.
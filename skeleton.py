@@ -4,12 +4,23 @@
 
 
 from . import coord_math as cmath
-from .constants import GENERIC_KEYS, SR_MAPPING
+from . import vector_math as vm
+from .constants import SR_MAPPING, MAPPING_GRAPH
 from . import orientation as ori
 import pymel.core as pm
 import pymel.core.datatypes as dt
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+import numpy as np
 from . import fbx_utils as fbx
 from . import constraints as cns
+from . import skeleton_index as ski
+from . import auto_match as am
+from . import datablock as db
+
+# Joint attributes index_skeleton(channels=True) captures, and copy_skeleton(fast=True) rebuilds.
+JOINT_CHANNELS = ['translate', 'rotate', 'scale', 'jointOrient', 'rotateAxis', 'rotateOrder', 
+    'segmentScaleCompensate', 'radius']
 
 def joint_from_components(name="_JNT"):
     '''
@@ -22,10 +33,11 @@ def joint_from_components(name="_JNT"):
     to name it.
     '''
 
-    # Use coord_math module to get average position.
-    selection = pm.ls(sl=True, fl=True)
+    # Use coord_math module to get average position.  The selection is left un-flattened so big
+    # component selections don't turn into one PyNode per vertex.
+    selection = pm.ls(sl=True)
     print ("selection is {}".format(selection))
-    position = cmath.get_average_xform(selection)
+    position = cmath.get_centroid(selection)
     pm.select(clear=True)
     
     joint = pm.joint(p=(position[0], position[1], position[2]), n=name)
@@ -33,6 +45,85 @@ def joint_from_components(name="_JNT"):
     return joint
 
 
+def index_skeleton(base_joints=None, joints_only=True, channels=False):
+    '''
+    Build a skeleton_index.SkeletonIndex of everything under the given joints with one om2 DAG
+    traversal: names, full paths, types, parent indices and world/local matrices.  Pass it around
+    to skeleton and orientation operations instead of re-querying Maya.
+
+    usage:
+    index_skeleton(base_joints=[list], joints_only=[boolean], channels=[boolean])
+    base_joints - node or list of nodes to index below (inclusive.)  Defaults to the selection.
+    joints_only - leave plain transforms out.  A joint under a transform under a joint still gets 
+    the upper joint as its parent.
+    channels - also capture the JOINT_CHANNELS values into index.channels (needs joints_only.)
+
+    returns:
+    SkeletonIndex
+    '''
+
+    if(channels and not joints_only):
+        pm.error("index_skeleton() can only capture channels with joints_only=True; plain "
+            "transforms have no jointOrient.")
+
+    if(base_joints is None):
+        base_joints = pm.ls(sl=True)
+    elif(not isinstance(base_joints, (list, tuple))):
+        base_joints = [base_joints]
+
+    selection = om.MSelectionList()
+    for base_joint in base_joints:
+        selection.add(str(base_joint))
+
+    paths = []
+    names = []
+    types = []
+    matrices = []
+    parents = []
+    path_index = {}
+
+    dag_iter = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kTransform)
+    for i in range(selection.length()):
+        dag_iter.reset(selection.getDagPath(i), om.MItDag.kDepthFirst, om.MFn.kTransform)
+        while(not dag_iter.isDone()):
+            dag_path = dag_iter.getPath()
+            dag_iter.next()
+
+            full_path = dag_path.fullPathName()
+            node_type = om.MFnDagNode(dag_path).typeName
+            if(full_path in path_index or node_type not in ['joint', 'transform'] or 
+                (joints_only and node_type != 'joint')):
+                continue
+
+            # Nearest ancestor that's already indexed; the traversal sees parents first.
+            parent = -1
+            ancestor_path = full_path.rsplit('|', 1)[0]
+            while(ancestor_path):
+                if(ancestor_path in path_index):
+                    parent = path_index[ancestor_path]
+                    break
+                ancestor_path = ancestor_path.rsplit('|', 1)[0]
+
+            path_index[full_path] = len(paths)
+            paths.append(full_path)
+            names.append(dag_path.partialPathName().rsplit('|', 1)[-1])
+            types.append(node_type)
+            parents.append(parent)
+            matrices.append(list(dag_path.inclusiveMatrix()))
+
+    captured = None
+    if(channels):
+        captured = {}
+        for attr in JOINT_CHANNELS:
+            values = [cmds.getAttr(path + '.' + attr) for path in paths]
+            # Compound attributes come back as [(x, y, z)].
+            captured[attr] = np.array([value[0] if isinstance(value, list) else value 
+                for value in values])
+
+    return ski.SkeletonIndex(names, parents, world_matrices=matrices, paths=paths, types=types, 
+        channels=captured)
+
+
 def duplicate_skeleton(prefix="duplicated_", joints_list=[]):
     '''
     DEPRECATED BY copy_skeleton()
@@ -48,19 +139,18 @@ def duplicate_skeleton(prefix="duplicated_", joints_list=[]):
     List of newly duplicated root joints.
     '''
 
-    # First we have to take the full joints list, and chase it to the top-most joint.
+    # First we have to take the full joints list, and chase it to the top-most joint.  Each joint's
+    # own DAG path is looked up, so the list lines up with joints_list even with repeats.
     root_joints = []
-    for joint in joints_list:
+    for joint, dag_path in zip(joints_list, cmath.get_dag_paths(joints_list)):
         # Check each joint for a lack of parents that are also joints, then collect them in roots.
-        parents = pm.listRelatives(joint, ap=True)
-        has_joint_parent = False
-        for parent in parents:
-            if(parent.type() == 'joint'):
-                has_joint_parent = True
-        
+        dag_fn = om.MFnDagNode(dag_path)
+        has_joint_parent = any(dag_fn.parent(i).hasFn(om.MFn.kJoint) 
+            for i in range(dag_fn.parentCount()))
+
         if(has_joint_parent == False):
             print ("Appending {} to the list of root joints to duplicate.".format(joint))
-            root_joints.append(joint)
+            root_joints.append(pm.PyNode(joint))
 
     # Duplicate the discovered roots, and make them a child of world.
     new_roots = []
@@ -77,34 +167,147 @@ def duplicate_skeleton(prefix="duplicated_", joints_list=[]):
     return new_roots
 
 
-def import_as_datablock():
+def import_as_datablock(cache_dir=db.DEFAULT_CACHE_DIR):
     '''
     Runs the import and performs the matching process
+
+    usage:
+    import_as_datablock(cache_dir=[string])
+    cache_dir - folder of cached datablocks (see datablock.DatablockCache.)  An FBX that's already
+    in there isn't imported again.  None always imports.
     '''
 
     # Get path of imported skeleton and create datablock.
     fbx_path = pm.filepath = pm.fileDialog2(ff="*.fbx", fm=1, dialogStyle=2, cap="Import FBX")[0]
-    data_block = fbx.import_skeleton(fbx_path)
+    cache = db.DatablockCache(cache_dir) if cache_dir else None
+    data_block = fbx.import_skeleton(fbx_path, cache=cache)
 
-    # Take the data block and use it to rebuild a skeleton
-    construct_from_datablock(data_block)
+    # Take the data block and use it to rebuild a skeleton, hierarchy and all.
+    build_from_datablock(data_block)
     # Match in scene
     pm.error("We haven't implementing the matching scheme builder yet.")
-    #translate_from_scene(data_block, cns.CLIENT_MAPPING, cns.SR_MAPPING)
+    #translate_from_scene(data_block, CLIENT_MAPPING, SR_MAPPING)
 
     # Aim each joint per best-vectors:
     orient_from_datablock(data_block)
 
-    # Restore hierarchy
-    hierarchy_from_datablock(data_block)
-
     print("Skeleton matched.")
 
 
+def strip_namespace(name):
+    '''
+    'match_import:hips' -> 'hips'.  None stays None.
+    '''
+
+    if(name is None):
+        return None
+
+    return str(name).split(':')[-1]
+
+
+def index_from_datablock(datablock):
+    '''
+    Turn the joint dicts of a datablock (see fbx_utils.import_skeleton) into a SkeletonIndex, with
+    namespaces stripped once up front.  Each joint keeps the world position and the jointOrient
+    (as a world orientation) the datablock gave it, the same as construct_from_datablock followed
+    by hierarchy_from_datablock would leave it; the channels to rebuild it are worked out in numpy.
+
+    returns:
+    SkeletonIndex with translate, jointOrient and rotateOrder channels.
+    '''
+
+    if(isinstance(datablock, db.Datablock)):
+        return _index_from_records(datablock.records)
+
+    joint_dicts = datablock[0]
+    names = [strip_namespace(joint_dict['name']) for joint_dict in joint_dicts]
+    name_index = dict((name, i) for i, name in enumerate(names))
+    # Parents are found by full path when the dicts have one, so duplicate short names can't pick
+    # the wrong parent.
+    path_index = dict((joint_dict['full_name'], i) for i, joint_dict in enumerate(joint_dicts)
+        if '|' in joint_dict.get('full_name', ''))
+
+    parents = []
+    for name, joint_dict in zip(names, joint_dicts):
+        parent_path = joint_dict.get('full_name', '').rsplit('|', 1)[0]
+        if(parent_path in path_index):
+            parents.append(path_index[parent_path])
+            continue
+        parent_name = strip_namespace(joint_dict['parent'])
+        if(parent_name is not None and parent_name not in name_index):
+            print("{}'s parent {} isn't in the datablock; it'll be a root.".format(name, 
+                parent_name))
+        parents.append(name_index.get(parent_name, -1))
+
+    world_matrices = vm.compose_transforms(
+        translates=[joint_dict['world_space_pos'] for joint_dict in joint_dicts],
+        joint_orients=[joint_dict.get('jointOrient', (0.0, 0.0, 0.0)) 
+            for joint_dict in joint_dicts]
+        )
+    rotate_orders = [joint_dict.get('rotate_order', 0) for joint_dict in joint_dicts]
+    rotate_orders = [vm.ROTATE_ORDERS.index(order) if isinstance(order, str) else int(order)
+        for order in rotate_orders]
+
+    index = ski.SkeletonIndex(names, parents, world_matrices=world_matrices)
+    rotations, _, translates = vm.decompose_matrices(index.local_matrices)
+    index.channels = {
+        'translate': translates,
+        'jointOrient': vm.matrix_to_euler(rotations, 'xyz'),
+        'rotateOrder': np.array(rotate_orders, dtype=np.int64)
+        }
+
+    return index
+
+
+def _index_from_records(records):
+    '''
+    index_from_datablock for a columnar Datablock: the parent rows are already there, so it's
+    straight array work.
+    '''
+
+    names = [strip_namespace(name) for name in records['name'].tolist()]
+    world_matrices = vm.compose_transforms(translates=records['world_space_pos'],
+        joint_orients=records['joint_orient'])
+
+    index = ski.SkeletonIndex(names, records['parent'], world_matrices=world_matrices)
+    rotations, _, translates = vm.decompose_matrices(index.local_matrices)
+    index.channels = {
+        'translate': translates,
+        'jointOrient': vm.matrix_to_euler(rotations, 'xyz'),
+        'rotateOrder': records['rotate_order'].astype(np.int64)
+        }
+
+    return index
+
+
+def build_from_datablock(datablock, prefix='data_'):
+    '''
+    A subprocess of skeleton-matching.
+    One pass replacement for construct_from_datablock + hierarchy_from_datablock: every joint is
+    created straight under its parent, in order, with its rotateOrder and jointOrient set (see
+    index_from_datablock and build_from_index.)
+
+    usage:
+    build_from_datablock(datablock, prefix=[string])
+
+    returns:
+    (dict) {joint name without namespace: full path of the new joint}
+    '''
+
+    print('Building imported skeleton in scene...')
+
+    index = index_from_datablock(datablock)
+    new_paths = build_from_index(index, names=[prefix + name for name in index.names])
+    print("Built {} joints.".format(len(new_paths)))
+
+    return dict(zip(index.names, new_paths))
+
+
 def construct_from_datablock(datablock, prefix='data_'):
     '''
     A subprocess of skeleton-matching.
     Constructs all the nodes in scene by reading the datablock given from fbx_utils.import_skeleton
+    See build_from_datablock to build and parent them in one pass.
     '''
 
     print('Building imported skeleton in scene...')
@@ -123,31 +326,44 @@ def construct_from_datablock(datablock, prefix='data_'):
     return
 
 
-def translate_from_scene(data_block):
+def translate_from_scene(data_block, import_map, export_map):
     '''
     A subprocess of skeleton-matching.
     orient all the contents created by the datablock to the "matches" found in scene.
     This is to be run after 'construct_from_datablock' as put the rebuilt joints in the scene.
+
+    usage:
+    translate_from_scene(data_block, import_map, export_map)
+    import_map - {generic key: joint name} for the imported (datablock) skeleton.
+    export_map - {generic key: joint name} for the skeleton in scene to match to.
     '''
 
     print('Matching imported skeleton...')
-    for bone in GENERIC_KEYS:
+
+    # Look joints up by name instead of scanning the datablock for every bone.
+    joint_dicts = {}
+    for joint_dict in data_block[0]:
+        joint_dicts[joint_dict['name']] = joint_dict
+        joint_dicts.setdefault(strip_namespace(joint_dict['name']), joint_dict)
+
+    pairs = []
+    for bone in MAPPING_GRAPH.order:
         print("matching {}".format(bone))
 
         # Skip anything unlisted on either side.
-        if(export_map[bone] == '' or import_map[bone] == ''):
+        if(not export_map.get(bone) or not import_map.get(bone)):
             continue
 
-        orient_to = pm.PyNode(export_map[bone])
-        oriented = pm.PyNode(import_map[bone])
-
         # Add a new key to the datablock for access later now that this relationship is established
-        for joint_dict in data_block[0]:
-            if(joint_dict['name'] == import_map[bone]):
-                joint_dict['match'] = export_map[bone]
-                print("Added {} to data block for  {}".format(export_map[bone], joint_dict['name']))
-                
-        pm.matchTransform(oriented, orient_to, pos=True, rot=False)
+        joint_dict = joint_dicts.get(import_map[bone])
+        if(joint_dict is not None):
+            joint_dict['match'] = export_map[bone]
+            print("Added {} to data block for  {}".format(export_map[bone], joint_dict['name']))
+
+        pairs.append((export_map[bone], import_map[bone]))
+
+    # Every match moves in one pass (position only, like the matchTransform it replaces.)
+    cmath.match_xforms(pairs, rotate=False)
 
     print ("Transform matching complete...")
 
@@ -220,6 +436,56 @@ def hierarchy_from_datablock(datablock, prefix='data_'):
             pm.parent(joint_node, parent_name)
 
 
+def auto_standard(datablock, mapping='sr', max_cost=1.0):
+    '''
+    Work out the `standard` dict for a client skeleton automatically instead of writing it by hand.
+    The reference is our own rig in the scene, found through MAPPING_GRAPH; the client comes from
+    the datablock.  See auto_match.match_skeletons for how they're paired.
+
+    usage:
+    auto_standard(datablock, mapping=[string], max_cost=float)
+    mapping - which of MAPPING_GRAPH's mappings names the reference joints in scene.
+    max_cost - how loose a pair can be before the key is left unmapped.
+
+    returns:
+    (standard, confidences) - {generic key: client joint name or ''} for every generic key, and
+    {generic key: 0.0 - 1.0} for the mapped ones.  Check the low confidences by hand.
+    '''
+
+    client = index_from_datablock(datablock)
+
+    # Reference joints that exist in scene; a joint shared by two keys only counts for the first.
+    keys = [key for key in MAPPING_GRAPH.order if MAPPING_GRAPH.joint(mapping, key) and 
+        MAPPING_GRAPH.key(mapping, MAPPING_GRAPH.joint(mapping, key)) == key and
+        cmds.objExists(MAPPING_GRAPH.joint(mapping, key))]
+    if(not keys):
+        pm.error("None of the {} joints are in the scene to match against.".format(mapping))
+
+    position = dict((key, i) for i, key in enumerate(MAPPING_GRAPH.order))
+    graph_index = ski.SkeletonIndex(MAPPING_GRAPH.order, 
+        [position.get(MAPPING_GRAPH.parent(key), -1) for key in MAPPING_GRAPH.order])
+    reference = graph_index.subset(graph_index.indices(keys))
+    reference_positions = cmath.get_world_matrices(
+        [MAPPING_GRAPH.joint(mapping, key) for key in keys])[:, 3, :3]
+
+    matches, confidences, _ = am.match_skeletons(
+        reference.names, reference.parents, reference_positions,
+        client.names, client.parents, client.positions(), max_cost=max_cost
+        )
+
+    standard = dict((key, '') for key in MAPPING_GRAPH.keys)
+    confidence = {}
+    for key, match, score in zip(reference.names, matches, confidences):
+        if(match >= 0):
+            standard[key] = client.names[match]
+            confidence[key] = float(score)
+
+    print("Matched {} of {} keys automatically; {} under 0.5 confidence.".format(len(confidence),
+        len(keys), len([score for score in confidence.values() if score < 0.5])))
+
+    return standard, confidence
+
+
 def build_reoriented_skeleton(our_basejoint, datablock, standard, data_prefix='data_'):
     '''
     Given the base joint of our rig, make a copy of the bones to map on.
@@ -239,16 +505,16 @@ def build_reoriented_skeleton(our_basejoint, datablock, standard, data_prefix='d
 
     # Prepare to collect some feedback stats.
     result = {'skipped':[], 'smart':[], 'dumb':[]}
-    dumb_list = []
+    orient_map = []
 
-    for map in GENERIC_KEYS:
-        print("mapping is {}".format(map))
-        key = map[0]
-        children = map[1]
+    # Parents come before children in the graph's order.
+    for key in MAPPING_GRAPH.order:
+        children = MAPPING_GRAPH.children[key]
+        print("mapping is {}: {}".format(key, children))
 
-        if((SR_MAPPING[key] == '') or (standard[key] == '')):
-            print("Skipping {}...".format(map[0]))
-            result['skipped'].append(map[0])
+        if((SR_MAPPING.get(key, '') == '') or (standard.get(key, '') == '')):
+            print("Skipping {}...".format(key))
+            result['skipped'].append(key)
             continue
 
         print("Generic Key {}:".format(key))
@@ -289,16 +555,10 @@ def build_reoriented_skeleton(our_basejoint, datablock, standard, data_prefix='d
                 format(local_joint))
             continue
         print("Copying orientation from {} to {}".format(source_joint, target_joint))
+        orient_map.append((source_joint, target_joint, source_child, target_child))
 
-        if(source_child != None):
-            ori.smart_copy_orient(
-                subject=source_joint, target=target_joint, s_child=source_child, 
-                t_child=target_child
-                )
-        else:
-            ori.dumb_copy_orient(subject=source_joint, target=target_joint)
-            dumb_list.append(target_joint.name())
-
+    # Every joint is solved and written together (see orientation.batch_copy_orient.)
+    dumb_list = ori.batch_copy_orient(orient_map)['dumb']
 
     print("Oriented {} joints using a \"dumb copy orient\", please double check these:\n{}".
         format(len(dumb_list), dumb_list))
@@ -317,18 +577,18 @@ def copy_orient_from_example(datablock, standard):
 
     # Prepare to collect some feedback stats.
     result = {'skipped':[], 'smart':[], 'dumb':[]}
-    dumb_list = []
+    orient_map = []
 
-    print (GENERIC_KEYS)
+    stored_cons = []
 
-    for map in GENERIC_KEYS:
-        print("Mapping is \"{}\"".format(map))
-        key = map[0]
-        children = map[1]
+    # Parents come before children in the graph's order.
+    for key in MAPPING_GRAPH.order:
+        children = MAPPING_GRAPH.children[key]
+        print("Mapping is \"{}\": {}".format(key, children))
 
-        if((SR_MAPPING[key] == '') or (standard[key] == '')):
-            print("Skipping {}...".format(map[0]))
-            result['skipped'].append(map[0])
+        if((SR_MAPPING.get(key, '') == '') or (standard.get(key, '') == '')):
+            print("Skipping {}...".format(key))
+            result['skipped'].append(key)
             continue
 
         print("Generic Key {}:".format(key))
@@ -369,38 +629,98 @@ def copy_orient_from_example(datablock, standard):
 
         # Must store all constraints and removed them so that the orientation can happen.  
         cons_on_target = cns.identify_constraints(target_joint)
-        stored_cons = []
         for constraint_node in cons_on_target:
             print("Attempting to store constraint node: {}".format(constraint_node))
             stored_cons.append(cns.StoredConstraint(constraint_node))
 
-        if(source_child != None):
-            ori.smart_copy_orient(
-                subject=source_joint, target=target_joint, s_child=source_child, 
-                t_child=target_child
-                )
-        else:
-            ori.dumb_copy_orient(subject=source_joint, target=target_joint)
-            dumb_list.append(target_joint.name())
+        orient_map.append((source_joint, target_joint, source_child, target_child))
+
+    # Every joint is solved and written together (see orientation.batch_copy_orient.)
+    dumb_list = ori.batch_copy_orient(orient_map)['dumb']
 
-        # Now rebuild all the constraints.
-        for cons in stored_cons:
-            print("Rebuilding {}".format(cons.name))
-            cons.rebuild()
+    # Now rebuild all the constraints.
+    for cons in stored_cons:
+        print("Rebuilding {}".format(cons.name))
+        cons.rebuild()
 
     print("Oriented {} joints using a \"dumb copy orient\", please double check these:\n{}".
         format(len(dumb_list), dumb_list))
     print("Done... \n")
 
         
-def copy_skeleton(base_joint=None, prefix=None, base_name='duplicate'):
+def build_from_index(index, names=None, parent=None):
+    '''
+    Create a fresh joint hierarchy from a SkeletonIndex captured with index_skeleton(channels=True).
+    Joints are created straight under their parents (parents first), and every captured channel is
+    set on them; nothing else-- constraints, shapes, connections-- comes along.  The roots keep
+    their captured world placement: their translate, scale and jointOrient are solved against the
+    new parent (or the world.)
+
+    usage:
+    build_from_index(index, names=[list], parent=[node])
+    names - (optional) a name for each new joint, in index order.  Defaults to index.names.
+    parent - (optional) node to build the roots under, instead of the world.
+
+    returns:
+    List of full paths of the new joints, in index order.
+    '''
+
+    if(not index.channels):
+        pm.error("The index has no captured channels; build it with index_skeleton(channels=True).")
+    if(names is None):
+        names = index.names
+
+    parent_path = cmds.ls(str(parent), long=True)[0] if parent is not None else ''
+    new_paths = [None] * len(index)
+    for i in index.preorder:
+        under = new_paths[index.parents[i]] if index.parents[i] >= 0 else parent_path
+        flags = {'name': names[i], 'skipSelect': True}
+        if(under):
+            flags['parent'] = under
+        # The new joint's full path is its parent's plus its own (possibly renamed) leaf name.
+        new_paths[i] = under + '|' + cmds.createNode('joint', **flags).rsplit('|', 1)[-1]
+
+    for attr in JOINT_CHANNELS:
+        if(attr not in index.channels):
+            continue
+        for path, value in zip(new_paths, index.channels[attr].tolist()):
+            if(isinstance(value, list)):
+                cmds.setAttr(path + '.' + attr, *value)
+            else:
+                cmds.setAttr(path + '.' + attr, value)
+
+    # Joints parented by hand don't get the inverseScale hookup pm.joint would give them.
+    for i in range(len(index)):
+        if(index.parents[i] >= 0):
+            cmds.connectAttr(new_paths[index.parents[i]] + '.scale', new_paths[i] + '.inverseScale')
+
+    # The roots' captured channels were relative to their old parents; re-solve them against the new
+    # one so the skeleton keeps its world placement.
+    roots = [i for i in range(len(index)) if index.parents[i] < 0]
+    if(roots and index.world_matrices is not None):
+        parent_world = (cmath.get_world_matrices([parent_path]) if parent_path else 
+            vm.as_matrices(np.eye(4)))
+        local_matrices = index.world_matrices[roots] @ vm.inverse(parent_world)
+        root_paths = [new_paths[i] for i in roots]
+        _, scales, _ = vm.decompose_matrices(local_matrices)
+        for path, scale in zip(root_paths, scales.tolist()):
+            cmds.setAttr(path + '.scale', *scale)
+        cmath.set_joint_orients(root_paths, local_matrices, keep_rotate=True, translate=True)
+
+    return new_paths
+
+
+def copy_skeleton(base_joint=None, prefix=None, base_name='duplicate', fast=False, index=None):
     '''
     Given a base_joint as a argument or selection, make a copy of that skeleton that is stripped of
     all constraints.
     
     usage:
-    copy_skeleton(base_joint=[joint])
+    copy_skeleton(base_joint=[joint], fast=[boolean], index=[SkeletonIndex])
     base_joint - The joint at the top of a rigs hierarchy.
+    fast - rebuild the joints from an index (see build_from_index) instead of duplicating the rig
+    and cleaning up after it.  Only joints are copied.
+    index - (optional) an index_skeleton(base_joint, channels=True) to build from in fast mode.
     '''
 
     # If no argument is given, fall back to viewport selection
@@ -410,6 +730,20 @@ def copy_skeleton(base_joint=None, prefix=None, base_name='duplicate'):
 
     base_joint_old_name = base_joint.name(long=None)
 
+    if(fast):
+        if(index is None):
+            index = index_skeleton(base_joint, channels=True)
+        if(prefix is not None):
+            names = [prefix + '_' + name for name in index.names]
+        else:
+            names = list(index.names)
+            names[index.index(base_joint.longName())] = "duplicate_{}".format(base_joint_old_name)
+
+        new_paths = build_from_index(index, names=names)
+        print("Rebuilt {} joints from {}.".format(len(new_paths), base_joint))
+
+        return pm.PyNode(new_paths[index.index(base_joint.longName())])
+
     decendent_joints = pm.listRelatives(base_joint, ad=True, type='joint') + [base_joint]
     # Make a list of things that aren't joints (by negating the above list from the full list.)
     decendent_garbage = ([l for l in pm.listRelatives(base_joint, ad=True) if l not in 
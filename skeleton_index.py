@@ -0,0 +1,222 @@
+'''
+skeleton_index.py
+
+An in-memory index of a joint hierarchy: names, parent indices, children and matrices as flat numpy
+arrays, so skeleton operations can look things up instead of asking Maya over and over.
+
+There are no Maya imports in here on purpose-- skeleton.index_skeleton() builds one from the scene
+with a single DAG traversal, and anything else (like an fbx datablock) can build one too.
+'''
+
+import numpy as np
+
+
+class SkeletonIndex:
+    '''
+    A hierarchy of N nodes stored by index.
+
+    usage:
+    index = SkeletonIndex(names, parents, world_matrices=[array], local_matrices=[array],
+        paths=[list], types=[list], channels=[dict])
+    names - short name of each node.
+    parents - index of each node's parent, or -1 for roots.  Parents don't have to come first.
+    world_matrices/local_matrices - (optional) (N, 4, 4) matrices in Maya's row-vector layout.  Give
+    either one and the other is worked out.
+    paths - (optional) unique full path of each node; defaults to the names.
+    types - (optional) node type of each node; defaults to 'joint'.
+    channels - (optional) dict of attribute name to (N, ...) array of captured values, like
+    {'jointOrient': (N, 3), 'rotateOrder': (N,)}.
+    '''
+
+    def __init__(self, names, parents, world_matrices=None, local_matrices=None, paths=None,
+        types=None, channels=None):
+
+        self.names = [str(name) for name in names]
+        self.parents = np.asarray(parents, dtype=np.int64).reshape(-1)
+        count = len(self.names)
+        if(len(self.parents) != count):
+            raise ValueError("Got {} parents for {} names.".format(len(self.parents), count))
+
+        self.paths = [str(path) for path in paths] if paths is not None else list(self.names)
+        self.types = list(types) if types is not None else ['joint'] * count
+        self.channels = dict(
+            (attr, np.asarray(values)) for attr, values in (channels or {}).items())
+
+        # Children lists, in the order the nodes were given.
+        has_parent = self.parents >= 0
+        child_order = np.argsort(self.parents, kind='stable')
+        child_order = child_order[has_parent[child_order]]
+        bounds = np.searchsorted(self.parents[child_order], 
+            [np.arange(count), np.arange(count) + 1])
+        self._children = [child_order[start:stop] for start, stop in zip(*bounds)]
+        self.roots = np.flatnonzero(~has_parent)
+
+        # A depth-first preorder.  Every subtree is a contiguous slice of it, so descendants are a
+        # slice and "is a inside b" is two comparisons.
+        self.preorder = np.empty(count, dtype=np.int64)
+        self.depths = np.zeros(count, dtype=np.int64)
+        self.root_of = np.empty(count, dtype=np.int64)
+        self._start = np.empty(count, dtype=np.int64)
+        self._end = np.empty(count, dtype=np.int64)
+        position = 0
+        for root in self.roots:
+            stack = [(root, False)]
+            while(stack):
+                node, done = stack.pop()
+                if(done):
+                    self._end[node] = position
+                    continue
+                self.preorder[position] = node
+                self._start[node] = position
+                self.root_of[node] = root
+                position += 1
+                stack.append((node, True))
+                for child in self._children[node][::-1]:
+                    self.depths[child] = self.depths[node] + 1
+                    stack.append((child, False))
+
+        if(position != count):
+            raise ValueError("Parent indices have a cycle; {} of {} nodes reach a root.".format(
+                position, count))
+
+        # Parents always come before their children in this order.
+        self.depth_order = np.argsort(self.depths, kind='stable')
+
+        self._path_index = dict((path, i) for i, path in enumerate(self.paths))
+        self._name_index = {}
+        for i, name in enumerate(self.names):
+            self._name_index.setdefault(name, []).append(i)
+
+        self.world_matrices = None
+        self.local_matrices = None
+        if(world_matrices is not None):
+            self.set_world_matrices(world_matrices)
+        elif(local_matrices is not None):
+            self.set_local_matrices(local_matrices)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return str(name) in self._path_index or str(name) in self._name_index
+
+    def index(self, name):
+        '''
+        Index of a node by full path or short name.  Raises KeyError if it isn't here, or if the
+        short name belongs to more than one node.
+        '''
+
+        name = str(name)
+        if(name in self._path_index):
+            return self._path_index[name]
+
+        hits = self._name_index.get(name.rsplit('|', 1)[-1], [])
+        if(len(hits) == 1):
+            return hits[0]
+        if(len(hits) > 1):
+            raise KeyError("{} matches {} nodes; use the full path.".format(name, len(hits)))
+        raise KeyError("{} isn't in this skeleton index.".format(name))
+
+    def indices(self, names):
+        '''
+        index() for many names, as an int64 array.
+        '''
+
+        return np.array([self.index(name) for name in names], dtype=np.int64)
+
+    def parent(self, i):
+        return self.parents[i]
+
+    def children(self, i):
+        return self._children[i]
+
+    def root(self, i):
+        return self.root_of[i]
+
+    def descendants(self, i):
+        '''
+        Every node below i, parents before children.
+        '''
+
+        return self.preorder[self._start[i] + 1:self._end[i]]
+
+    def subtree(self, i):
+        '''
+        i and everything below it, parents before children.
+        '''
+
+        return self.preorder[self._start[i]:self._end[i]]
+
+    def is_descendant(self, i, ancestor):
+        return self._start[ancestor] < self._start[i] < self._end[ancestor]
+
+    def ancestors(self, i):
+        '''
+        Parent, grandparent... up to the root.
+        '''
+
+        result = []
+        i = self.parents[i]
+        while(i >= 0):
+            result.append(i)
+            i = self.parents[i]
+
+        return np.array(result, dtype=np.int64)
+
+    def leaves(self):
+        return np.array([i for i in range(len(self)) if len(self._children[i]) == 0],
+            dtype=np.int64)
+
+    def set_world_matrices(self, world_matrices):
+        '''
+        Store world matrices and work out the locals from them.
+        '''
+
+        self.world_matrices = np.asarray(world_matrices, dtype=np.float64).reshape(-1, 4, 4)
+        parent_world = np.tile(np.eye(4), (len(self), 1, 1))
+        has_parent = self.parents >= 0
+        parent_world[has_parent] = self.world_matrices[self.parents[has_parent]]
+        self.local_matrices = self.world_matrices @ np.linalg.inv(parent_world)
+
+    def set_local_matrices(self, local_matrices):
+        '''
+        Store local matrices and work out the worlds from them, one depth level at a time.
+        '''
+
+        self.local_matrices = np.asarray(local_matrices, dtype=np.float64).reshape(-1, 4, 4)
+        self.world_matrices = self.local_matrices.copy()
+        for depth in range(1, int(self.depths.max(initial=0)) + 1):
+            level = np.flatnonzero(self.depths == depth)
+            self.world_matrices[level] = (self.local_matrices[level] @
+                self.world_matrices[self.parents[level]])
+
+    def positions(self):
+        '''
+        (N, 3) world positions.
+        '''
+
+        return self.world_matrices[:, 3, :3].copy()
+
+    def subset(self, indices):
+        '''
+        A new SkeletonIndex of just these nodes.  Each one's parent becomes its nearest ancestor
+        that's also in the subset.
+        '''
+
+        indices = np.asarray(indices, dtype=np.int64)
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[indices] = np.arange(len(indices))
+
+        parents = []
+        for i in indices:
+            parent = self.parents[i]
+            while(parent >= 0 and remap[parent] < 0):
+                parent = self.parents[parent]
+            parents.append(remap[parent] if parent >= 0 else -1)
+
+        return SkeletonIndex(
+            [self.names[i] for i in indices], parents,
+            world_matrices=None if self.world_matrices is None else self.world_matrices[indices],
+            paths=[self.paths[i] for i in indices], types=[self.types[i] for i in indices],
+            channels=dict((attr, values[indices]) for attr, values in self.channels.items())
+            )
@@ -0,0 +1,350 @@
+'''
+spatial.py
+
+Spatial lookups for matching points between meshes that don't share topology.
+
+Like delta_math.py, nothing in here imports Maya; everything works on plain numpy point and
+triangle arrays.
+'''
+
+import numpy as np
+
+
+class KDTree(object):
+    '''
+    A KD-tree over a point cloud, queried for many points at once.
+
+    Every query first walks straight down to the leaf holding it, which gives a tight upper bound on
+    the answer.  The tree is then swept level by level for all queries together, dropping any node
+    whose bounding box is further away than the best point found so far.  The result is exact.
+
+    usage:
+    tree = KDTree(points, leaf_size=int)
+    indices, distances = tree.nearest(query_points)
+    points - (N, 3) array of the points to index.
+    leaf_size - most points kept in a leaf.
+    '''
+
+    def __init__(self, points, leaf_size=16):
+
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        if(self.points.ndim != 2 or self.points.shape[1] != 3 or len(self.points) == 0):
+            raise ValueError("KDTree needs a non-empty (N, 3) point array.")
+
+        # Nodes own a contiguous range of self.order.  Children of an internal node are stored as
+        # indices into the node arrays; leaves have -1.
+        order = np.arange(len(self.points))
+        starts = [0]
+        stops = [len(self.points)]
+        lefts = [-1]
+        rights = [-1]
+        split_axes = [0]
+        split_values = [0.0]
+
+        stack = [0]
+        while(stack):
+            node = stack.pop()
+            start, stop = starts[node], stops[node]
+            if(stop - start <= leaf_size):
+                continue
+
+            members = order[start:stop]
+            member_points = self.points[members]
+            axis = int(np.argmax(member_points.max(axis=0) - member_points.min(axis=0)))
+            middle = (stop - start) // 2
+            partition = np.argpartition(member_points[:, axis], middle)
+            order[start:stop] = members[partition]
+
+            split_axes[node] = axis
+            split_values[node] = float(member_points[partition[middle], axis])
+
+            for child_start, child_stop in ((start, start + middle), (start + middle, stop)):
+                starts.append(child_start)
+                stops.append(child_stop)
+                lefts.append(-1)
+                rights.append(-1)
+                split_axes.append(0)
+                split_values.append(0.0)
+                stack.append(len(starts) - 1)
+            lefts[node] = len(starts) - 2
+            rights[node] = len(starts) - 1
+
+        self.order = order
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.array(stops, dtype=np.int64) - self.starts
+        self.lefts = np.array(lefts, dtype=np.int64)
+        self.rights = np.array(rights, dtype=np.int64)
+        self.split_axes = np.array(split_axes, dtype=np.int64)
+        self.split_values = np.array(split_values, dtype=np.float64)
+
+        # Tight bounding boxes, filled in from the leaves up (children always come after parents.)
+        self.lows = np.empty((len(starts), 3))
+        self.highs = np.empty((len(starts), 3))
+        for node in range(len(starts) - 1, -1, -1):
+            if(self.lefts[node] < 0):
+                node_points = self.points[order[starts[node]:stops[node]]]
+                self.lows[node] = node_points.min(axis=0)
+                self.highs[node] = node_points.max(axis=0)
+            else:
+                children = [self.lefts[node], self.rights[node]]
+                self.lows[node] = self.lows[children].min(axis=0)
+                self.highs[node] = self.highs[children].max(axis=0)
+
+        # Leaf members padded out to a fixed width (-1 past the end), so a batch of leaves can be
+        # scanned as one rectangular array.
+        leaves = np.flatnonzero(self.lefts < 0)
+        self.leaf_rows = np.full(len(starts), -1, dtype=np.int64)
+        self.leaf_rows[leaves] = np.arange(len(leaves))
+        width = max(int(self.counts[leaves].max()), 1)
+        slots = np.arange(width)
+        self.leaf_table = np.where(
+            slots < self.counts[leaves][:, None], 
+            order[np.minimum(self.starts[leaves][:, None] + slots, len(order) - 1)], 
+            -1
+            )
+
+    def nearest(self, query_points):
+        '''
+        Find the closest indexed point to each query point.
+
+        returns:
+        (indices, distances) - int64 index into the indexed points and float64 distance, one per
+        query point.
+        '''
+
+        query_points = np.ascontiguousarray(query_points, dtype=np.float64).reshape(-1, 3)
+        queries = np.arange(len(query_points))
+
+        best_index = np.full(len(query_points), -1, dtype=np.int64)
+        best_dist_sq = np.full(len(query_points), np.inf)
+
+        # Straight descent to each query's own leaf for a starting bound.
+        nodes = np.zeros(len(query_points), dtype=np.int64)
+        internal = self.lefts[nodes] >= 0
+        while(internal.any()):
+            at = nodes[internal]
+            go_left = query_points[internal, self.split_axes[at]] < self.split_values[at]
+            nodes[internal] = np.where(go_left, self.lefts[at], self.rights[at])
+            internal = self.lefts[nodes] >= 0
+        self._scan_leaves(query_points, queries, nodes, best_index, best_dist_sq)
+        home_leaves = nodes
+
+        # Then sweep the whole tree, pruning by bounding box.
+        nodes = np.zeros(len(query_points), dtype=np.int64)
+        while(len(queries) > 0):
+            points = query_points[queries]
+            gap = np.maximum(np.maximum(self.lows[nodes] - points, points - self.highs[nodes]), 0.0)
+            keep = np.einsum('ij,ij->i', gap, gap) < best_dist_sq[queries]
+            queries = queries[keep]
+            nodes = nodes[keep]
+
+            leaf = self.lefts[nodes] < 0
+            # A query's home leaf was already scanned.
+            fresh = leaf & (nodes != home_leaves[queries])
+            if(fresh.any()):
+                self._scan_leaves(
+                    query_points, queries[fresh], nodes[fresh], best_index, best_dist_sq
+                    )
+
+            queries = np.repeat(queries[~leaf], 2)
+            nodes = np.stack((self.lefts[nodes[~leaf]], self.rights[nodes[~leaf]]), axis=1).ravel()
+
+        return best_index, np.sqrt(best_dist_sq)
+
+    def _scan_leaves(self, query_points, queries, leaves, best_index, best_dist_sq):
+        '''
+        Check every point of each (query, leaf) pair and keep the closest per query.
+        '''
+
+        candidates = self.leaf_table[self.leaf_rows[leaves]]
+        diff = self.points[candidates] - query_points[queries][:, None, :]
+        dist_sq = np.where(candidates >= 0, np.einsum('ijk,ijk->ij', diff, diff), np.inf)
+
+        pick = np.argmin(dist_sq, axis=1)
+        rows = np.arange(len(queries))
+        pair_dist_sq = dist_sq[rows, pick]
+        pair_ids = candidates[rows, pick]
+
+        # A query can come with several leaves; keep its closest.
+        by_query = np.lexsort((pair_dist_sq, queries))
+        queries = queries[by_query]
+        firsts = np.concatenate(([True], queries[1:] != queries[:-1]))
+        queries = queries[firsts]
+        pair_dist_sq = pair_dist_sq[by_query][firsts]
+        pair_ids = pair_ids[by_query][firsts]
+
+        closer = pair_dist_sq < best_dist_sq[queries]
+        best_dist_sq[queries[closer]] = pair_dist_sq[closer]
+        best_index[queries[closer]] = pair_ids[closer]
+
+
+def vertex_triangle_adjacency(triangles, vertex_count):
+    '''
+    Build a padded table of the triangles touching each vertex.
+
+    usage:
+    vertex_triangle_adjacency(triangles, vertex_count)
+    triangles - (T, 3) int array of vertex ids.
+
+    returns:
+    (vertex_count, K) int64 array of triangle ids, padded with -1.  K is the highest valence.
+    '''
+
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    vertex_ids = triangles.ravel()
+    triangle_ids = np.repeat(np.arange(len(triangles)), 3)
+
+    order = np.argsort(vertex_ids, kind='stable')
+    vertex_ids = vertex_ids[order]
+    triangle_ids = triangle_ids[order]
+
+    valence = np.bincount(vertex_ids, minlength=vertex_count)
+    starts = np.concatenate(([0], np.cumsum(valence)[:-1]))
+    slot = np.arange(len(vertex_ids)) - starts[vertex_ids]
+
+    table = np.full((vertex_count, max(int(valence.max()), 1)), -1, dtype=np.int64)
+    table[vertex_ids, slot] = triangle_ids
+
+    return table
+
+
+def closest_point_on_triangles(points, a, b, c):
+    '''
+    Vectorized closest point on triangle (a, b, c) to each point, after Ericson's "Real-Time
+    Collision Detection" 5.1.5.  All inputs are (N, 3) and broadcast against each other.
+
+    returns:
+    (closest, barycentric) - (N, 3) closest points and their (N, 3) barycentric weights on a, b, c.
+    '''
+
+    points, a, b, c = np.broadcast_arrays(
+        *[np.asarray(array, dtype=np.float64) for array in (points, a, b, c)]
+        )
+
+    def dot(u, v):
+        return np.einsum('...i,...i->...', u, v)
+
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+
+    d1 = dot(ab, ap)
+    d2 = dot(ac, ap)
+    d3 = dot(ab, bp)
+    d4 = dot(ac, bp)
+    d5 = dot(ab, cp)
+    d6 = dot(ac, cp)
+
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    # Start from the interior (face region) answer and overwrite it region by region, in the
+    # reverse order of Ericson's early-outs so the first matching region wins.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = 1.0 / (va + vb + vc)
+        v = vb * denom
+        w = vc * denom
+        bary = np.stack((1.0 - v - w, v, w), axis=-1)
+
+        def region(mask, weights):
+            bary[mask] = weights[mask]
+
+        zeros = np.zeros_like(d1)
+        ones = np.ones_like(d1)
+
+        # Edge bc.
+        w_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        region((va <= 0) & ((d4 - d3) >= 0) & ((d5 - d6) >= 0),
+            np.stack((zeros, 1.0 - w_bc, w_bc), axis=-1))
+        # Edge ac.
+        w_ac = d2 / (d2 - d6)
+        region((vb <= 0) & (d2 >= 0) & (d6 <= 0), np.stack((1.0 - w_ac, zeros, w_ac), axis=-1))
+        # Vertex c.
+        region((d6 >= 0) & (d5 <= d6), np.stack((zeros, zeros, ones), axis=-1))
+        # Edge ab.
+        v_ab = d1 / (d1 - d3)
+        region((vc <= 0) & (d1 >= 0) & (d3 <= 0), np.stack((1.0 - v_ab, v_ab, zeros), axis=-1))
+        # Vertex b.
+        region((d3 >= 0) & (d4 <= d3), np.stack((zeros, ones, zeros), axis=-1))
+        # Vertex a.
+        region((d1 <= 0) & (d2 <= 0), np.stack((ones, zeros, zeros), axis=-1))
+
+    # Degenerate (zero area) triangles can still leave NaNs; fall back to vertex a.
+    bad = ~np.all(np.isfinite(bary), axis=-1)
+    bary[bad] = (1.0, 0.0, 0.0)
+
+    closest = bary[..., 0:1] * a + bary[..., 1:2] * b + bary[..., 2:3] * c
+
+    return closest, bary
+
+
+def triangle_correspondence(points, triangles, query_points, tree=None):
+    '''
+    Map each query point onto the surface of a triangle mesh.
+
+    The nearest vertex is found through a KDTree, then the closest point over the triangles
+    touching that vertex is taken.  That's exact for all but query points sitting over a long, thin
+    triangle that doesn't touch their nearest vertex, which is plenty for sculpt transfer.
+
+    usage:
+    triangle_correspondence(points, triangles, query_points, tree=[KDTree])
+    points - (N, 3) vertex positions of the mesh mapped onto.
+    triangles - (T, 3) vertex ids of its triangles.
+    query_points - (Q, 3) positions to map.
+    tree - (optional) a KDTree already built over points, to reuse between calls.
+
+    returns:
+    (triangle_vertices, barycentric, closest) - (Q, 3) vertex ids of the chosen triangle, (Q, 3)
+    weights on those vertices, and the (Q, 3) closest points themselves.
+    '''
+
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    query_points = np.ascontiguousarray(query_points, dtype=np.float64).reshape(-1, 3)
+
+    if(tree is None):
+        tree = KDTree(points)
+    nearest, _ = tree.nearest(query_points)
+
+    # (Q, K) candidate triangles; padding slots get an infinite distance below.
+    candidates = vertex_triangle_adjacency(triangles, len(points))[nearest]
+    valid = candidates >= 0
+    corners = triangles[np.where(valid, candidates, 0)]
+
+    closest, bary = closest_point_on_triangles(
+        query_points[:, None, :], points[corners[..., 0]], points[corners[..., 1]],
+        points[corners[..., 2]]
+        )
+    diff = closest - query_points[:, None, :]
+    dist_sq = np.where(valid, np.einsum('qki,qki->qk', diff, diff), np.inf)
+
+    # Points with no triangles at all (stray vertices) just snap to that vertex.
+    pick = np.argmin(dist_sq, axis=1)
+    rows = np.arange(len(query_points))
+    triangle_vertices = corners[rows, pick]
+    barycentric = bary[rows, pick]
+    closest = closest[rows, pick]
+
+    orphans = ~valid.any(axis=1)
+    triangle_vertices[orphans] = nearest[orphans, None]
+    barycentric[orphans] = (1.0, 0.0, 0.0)
+    closest[orphans] = points[nearest[orphans]]
+
+    return triangle_vertices, barycentric, closest
+
+
+def interpolate(values, triangle_vertices, barycentric):
+    '''
+    Blend per-vertex values (like deltas) at the points given by triangle_correspondence().
+
+    returns:
+    (Q, ...) array of the weighted values.
+    '''
+
+    values = np.asarray(values, dtype=np.float64)
+    weights = barycentric.reshape(barycentric.shape + (1,) * (values.ndim - 1))
+
+    return np.sum(values[triangle_vertices] * weights, axis=1)
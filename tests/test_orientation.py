@@ -0,0 +1,61 @@
+'''
+smart_copy_orient and batch_copy_orient have to agree: the single-joint tool and the whole-skeleton
+passes (build_reoriented_skeleton, copy_orient_from_example) are expected to orient the same joints
+the same way.
+
+Needs Maya; run it with mayapy -m pytest.
+'''
+
+import itertools
+
+import numpy as np
+import pytest
+
+standalone = pytest.importorskip('maya.standalone')
+
+# Every 90 degree relabelling of the axes, each with a couple of degrees of noise on top.
+_rng = np.random.default_rng(0)
+RELABELS = [(np.array(angles) + _rng.uniform(-2.0, 2.0, 3)).tolist() 
+    for angles in itertools.product([0.0, 90.0, 180.0, -90.0], repeat=3)]
+
+
+@pytest.fixture(scope='module')
+def maya_session():
+    standalone.initialize(name='python')
+    import maya.cmds as cmds
+    yield cmds
+    standalone.uninitialize()
+
+
+def _chain(cmds, name, joint_orient):
+    cmds.select(clear=True)
+    base = cmds.joint(name=name, position=(0.0, 0.0, 0.0))
+    child = cmds.joint(name=name + '_end', position=(10.0, 0.0, 0.0))
+    cmds.joint(base, edit=True, orientation=joint_orient, zeroScaleOrient=False)
+    cmds.xform(child, worldSpace=True, translation=(10.0, 0.0, 0.0))
+
+    return base, child
+
+
+def _world(cmds, node):
+    return np.array(cmds.xform(node, query=True, matrix=True, worldSpace=True)).reshape(4, 4)
+
+
+@pytest.mark.parametrize('joint_orient', RELABELS)
+def test_single_and_batch_copy_orient_agree(maya_session, joint_orient):
+    cmds = maya_session
+    from sr_suite_utilities import orientation
+
+    cmds.file(new=True, force=True)
+    source, source_child = _chain(cmds, 'source', (0.0, 0.0, 0.0))
+    single, single_child = _chain(cmds, 'single', joint_orient)
+    batch, batch_child = _chain(cmds, 'batch', joint_orient)
+
+    orientation.smart_copy_orient(source, single, source_child, single_child)
+    orientation.batch_copy_orient([(source, batch, source_child, batch_child)])
+
+    np.testing.assert_allclose(_world(cmds, single), _world(cmds, batch), atol=1e-6)
+    # Both recover the source's labelling, and the children stay put.
+    np.testing.assert_allclose(_world(cmds, single)[:3, :3], _world(cmds, source)[:3, :3], 
+        atol=0.15)
+    np.testing.assert_allclose(_world(cmds, single_child)[3, :3], [10.0, 0.0, 0.0], atol=1e-6)
@@ -0,0 +1,491 @@
+'''
+vector_math.py
+
+Batched vector and matrix math over numpy arrays, so whole hierarchies can be worked on at once
+instead of one dt.Vector at a time.
+
+There are no Maya imports in here on purpose-- it loads instantly and can be tested without Maya.
+Matrices follow Maya's layout: row vectors, rows 0-2 are the x/y/z axes and row 3 is the
+translation, so a point is transformed with point @ matrix and a child's world matrix is
+local @ parent_world.
+'''
+
+import numpy as np
+
+AXES = ['x', 'y', 'z']
+SIGNED_AXES = ['x', 'y', 'z', '-x', '-y', '-z']
+
+# Maya's rotateOrder enum, in order.
+ROTATE_ORDERS = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+# Anything shorter than this is treated as zero length.
+EPSILON = 1e-12
+
+
+def as_vectors(vectors):
+    '''
+    Cast to a float64 array of shape (N, 3).  A single vector becomes (1, 3).
+    '''
+
+    return np.asarray(vectors, dtype=np.float64).reshape(-1, 3)
+
+
+def as_matrices(matrices):
+    '''
+    Cast to a float64 array of shape (N, 4, 4).  Accepts 16 flat values per matrix too, like
+    cmds.xform(q=True, m=True) gives.
+    '''
+
+    return np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+
+
+def dot(a, b):
+    '''
+    Row-wise dot product of two (N, 3) arrays.
+    '''
+
+    return np.einsum('ij,ij->i', as_vectors(a), as_vectors(b))
+
+
+def cross(a, b):
+    '''
+    Row-wise cross product of two (N, 3) arrays.
+    '''
+
+    return np.cross(as_vectors(a), as_vectors(b))
+
+
+def length(vectors):
+    '''
+    Length of each row.
+    '''
+
+    return np.linalg.norm(as_vectors(vectors), axis=1)
+
+
+def normalize(vectors):
+    '''
+    Unit length copies of each row.  Zero length rows stay zero instead of becoming NaN.
+    '''
+
+    vectors = as_vectors(vectors)
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > EPSILON)
+
+
+def vectors(points_a, points_b):
+    '''
+    The vector from each point in points_b to the matching point in points_a (a - b), the same as
+    coord_math.get_vector.
+    '''
+
+    return as_vectors(points_a) - as_vectors(points_b)
+
+
+def normals(points_a, points_b, points_c, unit=True):
+    '''
+    Normal of each triangle (a, b, c), taken as (c - a) x (b - a) like coord_math.get_normal.
+
+    usage:
+    normals(points_a, points_b, points_c, unit=[boolean])
+    unit - normalize the results; otherwise their length is twice the triangle's area.
+    '''
+
+    points_a = as_vectors(points_a)
+    result = cross(as_vectors(points_c) - points_a, as_vectors(points_b) - points_a)
+
+    return normalize(result) if unit else result
+
+
+def angle(a, b):
+    '''
+    Angle in radians between each pair of rows (like dt.Vector.angle.)  Uses atan2, so it stays
+    accurate for nearly parallel vectors where acos falls apart.
+    '''
+
+    a = as_vectors(a)
+    b = as_vectors(b)
+
+    return np.arctan2(np.linalg.norm(np.cross(a, b), axis=1), np.einsum('ij,ij->i', a, b))
+
+
+def axis_index(axis):
+    '''
+    Turn 'x', '-y', 0, 1, 2... into (index, sign).
+    '''
+
+    if(isinstance(axis, str)):
+        if(axis not in SIGNED_AXES):
+            raise ValueError("Bad axis {}; must be one of {}.".format(axis, SIGNED_AXES))
+        return AXES.index(axis[-1]), (-1.0 if axis.startswith('-') else 1.0)
+
+    if(axis not in (0, 1, 2)):
+        raise ValueError("Bad axis int {}; should be 0,1,2 for x,y,z.".format(axis))
+    return axis, 1.0
+
+
+def _build_permutations():
+    '''
+    All 24 signed axis permutations with a determinant of +1, and a lookup from two axis
+    assignments to the one permutation that satisfies both.
+    '''
+
+    permutations = []
+    for order in [(0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (2, 1, 0), (1, 0, 2)]:
+        for signs in np.ndindex(2, 2, 2):
+            matrix = np.zeros((3, 3))
+            matrix[[0, 1, 2], order] = [1.0 - 2.0 * sign for sign in signs]
+            if(np.linalg.det(matrix) > 0):
+                permutations.append(matrix)
+    permutations = np.array(permutations)
+
+    # table[new_a, old_a, flip_a, new_b, old_b, flip_b] -> permutation index (or -1), for
+    # new[new_a] = +-old[old_a] and new[new_b] = +-old[old_b].
+    table = np.full((3, 3, 2, 3, 3, 2), -1, dtype=np.int64)
+    for index, matrix in enumerate(permutations):
+        columns = np.argmax(np.abs(matrix), axis=1)
+        flips = (matrix[[0, 1, 2], columns] < 0).astype(np.int64)
+        for a in range(3):
+            for b in range(3):
+                if(a != b):
+                    table[a, columns[a], flips[a], b, columns[b], flips[b]] = index
+
+    return permutations, table
+
+
+# (24, 3, 3) proper signed permutation matrices; new_rows = permutation @ old_rows.
+AXIS_PERMUTATIONS, _PERMUTATION_TABLE = _build_permutations()
+
+
+def axis_permutations(new_a, old_a, new_b, old_b):
+    '''
+    Look up, for many joints at once, the proper axis permutation that moves old axis old_a onto
+    new axis new_a and old_b onto new_b.  Axes are SIGNED_AXES indices (0-5), so '-y' is 4;  the
+    sign says the new axis points along the negative of the old one.  The third axis follows from
+    keeping the result right handed.
+
+    returns:
+    (N,) int64 indices into AXIS_PERMUTATIONS.
+    '''
+
+    new_a, old_a, new_b, old_b = [np.asarray(axes, dtype=np.int64).ravel() 
+        for axes in (new_a, old_a, new_b, old_b)]
+    flip_a = (new_a // 3) ^ (old_a // 3)
+    flip_b = (new_b // 3) ^ (old_b // 3)
+    indices = _PERMUTATION_TABLE[new_a % 3, old_a % 3, flip_a, new_b % 3, old_b % 3, flip_b]
+    if((indices < 0).any()):
+        raise ValueError("Axis swaps must use two different axes on each side.")
+
+    return indices
+
+
+def down_axes(axes, vectors, signed=False):
+    '''
+    Which axis of each joint points most along a vector (like down the bone to its child.)
+
+    usage:
+    down_axes(axes, vectors, signed=[boolean])
+    axes - (N, 3, 3) axis rows (or (N, 4, 4) matrices.)
+    vectors - (N, 3) directions.
+    signed - pick from all six signed axes (SIGNED_AXES indices) instead of only x, y, z.
+
+    returns:
+    (N,) int64 indices.
+    '''
+
+    axes = np.asarray(axes, dtype=np.float64)
+    axes = axes.reshape((-1,) + axes.shape[-2:])[:, :3, :3]
+    axes = normalize(axes.reshape(-1, 3)).reshape(-1, 3, 3)
+    dots = np.einsum('nij,nj->ni', axes, normalize(vectors))
+    if(signed):
+        dots = np.concatenate([dots, -dots], axis=1)
+
+    return np.argmax(dots, axis=1)
+
+
+def closest_axes(source_axes, target_axes, source_exclude=None, target_exclude=None,
+    exclude_opposite=False):
+    '''
+    The most parallel pair between the six signed axes of each source and the three axes of each
+    target, from one (N, 6, 3) matrix of dot products.
+
+    usage:
+    closest_axes(source_axes, target_axes, source_exclude=[array], target_exclude=[array],
+        exclude_opposite=[boolean])
+    source_axes/target_axes - (N, 3, 3) axis rows (or (N, 4, 4) matrices.)
+    source_exclude - (N,) SIGNED_AXES indices to leave out of the sources.  -1 or None for none.
+    target_exclude - (N,) 0-2 axis indices to leave out of the targets.
+    exclude_opposite - also leave out the opposite sign of each source_exclude (ruling out the
+    whole axis, like copy-orient's down axis.)  By default only that exact signed axis is left out,
+    like orientation.closest_axis always did.
+
+    returns:
+    (source, target) - (N,) SIGNED_AXES indices and (N,) 0-2 indices.
+    '''
+
+    source_axes = np.asarray(source_axes, dtype=np.float64)
+    target_axes = np.asarray(target_axes, dtype=np.float64)
+    source_axes = source_axes.reshape((-1,) + source_axes.shape[-2:])[:, :3, :3]
+    target_axes = target_axes.reshape((-1,) + target_axes.shape[-2:])[:, :3, :3]
+    source_axes = normalize(source_axes.reshape(-1, 3)).reshape(-1, 3, 3)
+    target_axes = normalize(target_axes.reshape(-1, 3)).reshape(-1, 3, 3)
+
+    count = len(source_axes)
+    rows = np.arange(count)
+    dots = np.einsum('nij,nkj->nik', np.concatenate([source_axes, -source_axes], axis=1), 
+        target_axes)
+
+    if(source_exclude is not None):
+        source_exclude = np.broadcast_to(np.asarray(source_exclude, dtype=np.int64), (count,))
+        use = rows[source_exclude >= 0]
+        dots[use, source_exclude[use], :] = -np.inf
+        if(exclude_opposite):
+            dots[use, (source_exclude[use] + 3) % 6, :] = -np.inf
+    if(target_exclude is not None):
+        target_exclude = np.broadcast_to(np.asarray(target_exclude, dtype=np.int64), (count,))
+        use = rows[target_exclude >= 0]
+        dots[use, :, target_exclude[use] % 3] = -np.inf
+
+    flat = np.argmax(dots.reshape(count, 18), axis=1)
+
+    return flat // 3, flat % 3
+
+
+def matrix_axis(matrices, axis):
+    '''
+    Pull one axis row out of every matrix.
+
+    usage:
+    matrix_axis(matrices, axis)
+    axis - 0/1/2 or 'x'/'y'/'z', optionally negated like '-y'.
+
+    returns:
+    (N, 3) array, not normalized.
+    '''
+
+    index, sign = axis_index(axis)
+
+    return as_matrices(matrices)[:, index, :3] * sign
+
+
+def compose_matrices(x_axes, y_axes, z_axes, translates=None):
+    '''
+    Build (N, 4, 4) matrices from axis rows and translations.
+    '''
+
+    x_axes = as_vectors(x_axes)
+    matrices = np.zeros((len(x_axes), 4, 4))
+    matrices[:, 0, :3] = x_axes
+    matrices[:, 1, :3] = as_vectors(y_axes)
+    matrices[:, 2, :3] = as_vectors(z_axes)
+    if(translates is not None):
+        matrices[:, 3, :3] = as_vectors(translates)
+    matrices[:, 3, 3] = 1.0
+
+    return matrices
+
+
+def decompose_matrices(matrices):
+    '''
+    Split matrices into unit axes, scales and translations.  Shear is ignored.
+
+    returns:
+    (rotations, scales, translates) - (N, 3, 3) orthonormal-ish axis rows, (N, 3) per-axis scale
+    (negative on x when the matrix is mirrored) and (N, 3) translations.
+    '''
+
+    matrices = as_matrices(matrices)
+    axes = matrices[:, :3, :3].copy()
+    scales = np.linalg.norm(axes, axis=2)
+
+    # Keep the rotation proper; a mirror goes into the x scale.
+    mirrored = np.linalg.det(axes) < 0
+    scales[mirrored, 0] *= -1.0
+
+    rotations = np.divide(axes, scales[:, :, None], out=np.zeros_like(axes),
+        where=np.abs(scales[:, :, None]) > EPSILON)
+
+    return rotations, scales, matrices[:, 3, :3].copy()
+
+
+def orthonormalize(rotations):
+    '''
+    Snap (N, 3, 3) axis rows back to the closest proper rotation (via SVD.)
+    '''
+
+    u, _, vt = np.linalg.svd(np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3))
+    result = u @ vt
+    flip = np.linalg.det(result) < 0
+    u[flip, :, 2] *= -1.0
+
+    return u @ vt
+
+
+def _axis_rotation(index, angles):
+    '''
+    Row-vector rotation matrices about one axis, one per angle (radians.)
+    '''
+
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    result = np.zeros((len(angles), 3, 3))
+    i, j = [(1, 2), (2, 0), (0, 1)][index]
+    result[:, index, index] = 1.0
+    result[:, i, i] = cos
+    result[:, i, j] = sin
+    result[:, j, i] = -sin
+    result[:, j, j] = cos
+
+    return result
+
+
+def _rotate_order(order):
+    if(not isinstance(order, str)):
+        order = ROTATE_ORDERS[int(order)]
+    if(order not in ROTATE_ORDERS):
+        raise ValueError("Bad rotate order {}; must be one of {}.".format(order, ROTATE_ORDERS))
+    return [AXES.index(letter) for letter in order]
+
+
+def euler_to_matrix(angles, order='xyz', degrees=True):
+    '''
+    (N, 3) Euler angles to (N, 3, 3) rotation matrices, the way Maya builds them: for rotate order
+    'xyz', x is applied first, so R = Rx @ Ry @ Rz with row vectors.
+
+    usage:
+    euler_to_matrix(angles, order=[string or int], degrees=[boolean])
+    order - one of ROTATE_ORDERS, or its rotateOrder enum int.
+    '''
+
+    angles = as_vectors(angles)
+    if(degrees):
+        angles = np.radians(angles)
+
+    first, second, third = _rotate_order(order)
+
+    return (_axis_rotation(first, angles[:, first]) @ _axis_rotation(second, angles[:, second]) @
+        _axis_rotation(third, angles[:, third]))
+
+
+def matrix_to_euler(rotations, order='xyz', degrees=True):
+    '''
+    (N, 3, 3) rotation matrices (or (N, 4, 4) matrices with unit axes) to (N, 3) Euler angles for
+    the given rotate order.  Inverse of euler_to_matrix.  At gimbal lock the last rotation is
+    folded into the first.
+    '''
+
+    rotations = np.asarray(rotations, dtype=np.float64)
+    rotations = rotations.reshape((-1,) + rotations.shape[-2:])[:, :3, :3]
+
+    i, j, k = _rotate_order(order)
+    # Even permutations of xyz have parity 1.
+    parity = 1.0 if (j - i) % 3 == 1 else -1.0
+
+    # Working with the column-vector form, M = Rk @ Rj @ Ri.
+    m = np.swapaxes(rotations, 1, 2)
+
+    sin_b = np.clip(-parity * m[:, k, i], -1.0, 1.0)
+    cos_b = np.sqrt(m[:, i, i] ** 2 + m[:, j, i] ** 2)
+    locked = cos_b < 1e-9
+
+    a = np.arctan2(parity * m[:, k, j], m[:, k, k])
+    b = np.arctan2(sin_b, cos_b)
+    c = np.arctan2(parity * m[:, j, i], m[:, i, i])
+
+    # Gimbal lock: c is unrecoverable, so zero it and put everything in a.
+    a[locked] = np.arctan2(-parity * m[locked, j, k], m[locked, j, j])
+    c[locked] = 0.0
+
+    angles = np.zeros((len(rotations), 3))
+    angles[:, i] = a
+    angles[:, j] = b
+    angles[:, k] = c
+
+    return np.degrees(angles) if degrees else angles
+
+
+def aim_matrices(aim_vectors, up_vectors, aim_axis=0, up_axis=2):
+    '''
+    Rotations that point aim_axis down each aim vector and twist up_axis toward each up vector, like
+    orientation.aim_at for many joints at once.  The results are always right handed: the third
+    axis is crossed in whichever order keeps the determinant positive.
+
+    usage:
+    aim_matrices(aim_vectors, up_vectors, aim_axis=int, up_axis=int)
+    aim_vectors/up_vectors - (N, 3), or one up vector for all.
+    aim_axis/up_axis - 0, 1, 2 for x, y, z; must differ.
+
+    returns:
+    (N, 3, 3) unit axis rows.
+    '''
+
+    if(aim_axis not in (0, 1, 2) or up_axis not in (0, 1, 2) or aim_axis == up_axis):
+        raise ValueError("aim_axis and up_axis must be two different ints of 0,1,2 for x,y,z.")
+
+    aim = normalize(aim_vectors)
+    up = normalize(np.broadcast_to(as_vectors(up_vectors), aim.shape))
+
+    last = normalize(np.cross(up, aim))
+    up = normalize(np.cross(aim, last))
+
+    # Half of the axis combinations would come out mirrored; (aim, up) running backwards round
+    # x->y->z needs the last axis the other way (aim x up rather than up x aim.)
+    if((aim_axis, up_axis) in [(0, 1), (1, 2), (2, 0)]):
+        last = -last
+
+    rotations = np.zeros((len(aim), 3, 3))
+    rotations[:, aim_axis] = aim
+    rotations[:, up_axis] = up
+    rotations[:, 3 - aim_axis - up_axis] = last
+
+    return rotations
+
+
+def compose_transforms(translates=None, rotates=None, scales=None, rotate_orders=0,
+    joint_orients=None):
+    '''
+    Build local (N, 4, 4) matrices from channel values the way Maya does for joints and transforms
+    with untouched pivots: S @ R @ JO, then translation.
+
+    usage:
+    compose_transforms(translates=[array], rotates=[array], scales=[array],
+        rotate_orders=[int or array], joint_orients=[array])
+    All arrays are (N, 3) with angles in degrees; leave one out for its identity.
+    rotate_orders - one rotateOrder for all, or one per matrix.
+    '''
+
+    count = max(len(as_vectors(values)) for values in (translates, rotates, scales, joint_orients)
+        if values is not None)
+
+    matrices = np.tile(np.eye(4), (count, 1, 1))
+    rotation = np.tile(np.eye(3), (count, 1, 1))
+
+    if(rotates is not None):
+        rotates = as_vectors(rotates)
+        rotate_orders = np.broadcast_to(np.asarray(
+            [order if not isinstance(order, str) else ROTATE_ORDERS.index(order)
+            for order in np.atleast_1d(rotate_orders)], dtype=np.int64), (count,))
+        for order in np.unique(rotate_orders):
+            same = rotate_orders == order
+            rotation[same] = euler_to_matrix(rotates[same], order)
+
+    if(joint_orients is not None):
+        rotation = rotation @ euler_to_matrix(joint_orients, 'xyz')
+
+    if(scales is not None):
+        rotation = as_vectors(scales)[:, :, None] * rotation
+
+    matrices[:, :3, :3] = rotation
+    if(translates is not None):
+        matrices[:, 3, :3] = as_vectors(translates)
+
+    return matrices
+
+
+def inverse(matrices):
+    '''
+    Batched inverse of (N, 4, 4) matrices.
+    '''
+
+    return np.linalg.inv(as_matrices(matrices))